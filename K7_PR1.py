@@ -1,28 +1,129 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+import json
 import time
 import random
+import queue
+import threading
 
 
+from book import load_book
+from engine import GameState, SearchEngine, SearchResult, SearchCancelled, MINIMAX, ALPHA_BETA, \
+   PVS, MCTS, PERFECT, ORDERINGS
+from gamelog import GameLog
+from mcts import MonteCarloSearch
+from rules import final_score, winner
+from transposition import TranspositionTable
 
 
-class GameTreeNode:
-   def __init__(self, value, parent=None, move=None):
-       self.value = value  # The current number in the game
-       self.parent = parent  # Parent node
-       self.move = move  # The move (3, 4, or 5) that led to this node
-       self.children = []  # Child nodes
-       self.score = None  # Heuristic score
-       self.terminal = False  # Whether this is an end state
 
 
-   def add_child(self, child_node):
-       self.children.append(child_node)
+MCTS_WORKERS = 2  # Playout processes besides the UI's own, a fixed few to keep the desktop usable
 
 
-   def is_terminal(self):
-       """Check if this node represents an end game state"""
-       return self.value >= 3000
+
+
+def format_score(score):
+   if score is None:
+       return ""
+   if score == float('inf'):
+       return "win"
+   if score == float('-inf'):
+       return "loss"
+   return f"{score:.2f}"
+
+
+
+
+class SearchTreeView(ttk.Frame):
+   """Treeview over the tree of a search that only inserts the rows of opened nodes.
+
+   Works on SearchTrace trees, where unscored children were pruned, and on MCTSNode trees.
+   Rows on the principal variation are highlighted.
+   """
+
+   PLACEHOLDER = "placeholder"  # Child row that makes an unopened node expandable
+
+   def __init__(self, parent, root_node, notes=None, best_moves=None):
+       super().__init__(parent)
+       self.nodes = {}  # Row id -> node
+       self.notes = notes or {}  # id(node) -> remark for the note column
+       self.best_moves = best_moves or {}  # id(node) -> move the search picked there
+       self.mcts = hasattr(root_node, 'visits')
+       self.tree = ttk.Treeview(self, columns=("score", "note"), height=10)
+       self.tree.heading("#0", text="Move")
+       self.tree.heading("score", text="Visits / wins" if self.mcts else "Score")
+       self.tree.heading("note", text="")
+       self.tree.column("#0", width=200)
+       self.tree.column("score", width=110, anchor="e")
+       self.tree.column("note", width=150)
+       self.tree.tag_configure("pv", foreground="red")
+       self.tree.tag_configure("pruned", foreground="gray")
+       scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+       self.tree.configure(yscrollcommand=scrollbar.set)
+       self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+       scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+       self.tree.bind("<<TreeviewOpen>>", self.on_open)
+
+
+       self.pv = set()  # ids of the nodes on the principal variation
+       node, maximizing = root_node, True
+       while node is not None:
+           self.pv.add(id(node))
+           node, maximizing = self.best_child(node, maximizing), not maximizing
+       root_id = self.insert("", root_node, "Searched position")
+       self.tree.item(root_id, open=True)
+       self.fill(root_id)
+
+
+   def best_child(self, node, maximizing):
+       """Child the search picked, else the most visited (MCTS) or best scored one"""
+       if id(node) in self.best_moves:
+           move = self.best_moves[id(node)]
+           return next((child for child in node.children if child.move == move), None)
+       if self.mcts:
+           return max(node.children, key=lambda child: child.visits, default=None)
+       scored = [child for child in node.children if child.score is not None]
+       if not scored:
+           return None
+       pick = max if maximizing else min
+       return pick(scored, key=lambda child: child.score)
+
+
+   def insert(self, parent_id, node, text):
+       if self.mcts:
+           score = f"{node.visits} / {node.wins}"
+           pruned = False
+       else:
+           score = format_score(node.score)
+           pruned = node.score is None
+       if id(node) in self.pv:
+           tags, note = ("pv",), "principal variation"
+       elif pruned:
+           tags, note = ("pruned",), "pruned"
+       else:
+           tags, note = (), ""
+       if id(node) in self.notes:
+           note = f"{note}, {self.notes[id(node)]}" if note else self.notes[id(node)]
+       row_id = self.tree.insert(parent_id, "end", text=text, values=(score, note), tags=tags)
+       self.nodes[row_id] = node
+       if node.children:
+           self.tree.insert(row_id, "end", text=self.PLACEHOLDER)
+       return row_id
+
+
+   def fill(self, row_id):
+       """Replace the placeholder of an opened row with its children"""
+       children = self.tree.get_children(row_id)
+       if len(children) != 1 or self.tree.item(children[0], "text") != self.PLACEHOLDER:
+           return  # Already filled
+       self.tree.delete(children[0])
+       for child in self.nodes[row_id].children:
+           self.insert(row_id, child, f"×{child.move} → {child.value}")
+
+
+   def on_open(self, event):
+       self.fill(self.tree.focus())
 
 
 
@@ -31,7 +132,7 @@ class UI:
    def __init__(self, root):
        self.root = root
        self.root.title("PW_1")
-       self.root.geometry("400x750")
+       self.root.geometry("400x810")
        self.root.resizable(False, False)
        self.game_active = False
 
@@ -42,15 +143,25 @@ class UI:
        self.alg = ""  # Algorithm chosen
        self.total_points = 0  # Total points
        self.current_number = 0  # Current number
+       self.start_number = 0  # Number the game started from
        self.game_bank = 0  # Game_bank
        self.depth = 0  # depth for search
+       self.budget = tk.IntVar(value=0)  # Time budget per computer move in ms
+       self.time_budget = 0  # Budget of the running game, 0 means fixed depth
        self.nodes_visited = 0
        self.move_history = []
        self.computation_time = 0
+       self.engine = SearchEngine()  # Headless search engine
+       self.search_results = queue.Queue()  # (engine, result or exception) from search threads
+       self.turn_timer = None  # after() id of the scheduled play_turn_comp
+       self.thinking = False  # A search for the computer's move is running
+       self.book = load_book()  # Precomputed opening moves, None if no book has been built
+       self.log = GameLog()  # Every game is appended to the on-disk game log
 
 
        # Store last game data for post-game viewing
        self.last_game_data = {
+           'start_number': 0,
            'current_number': 0,
            'move_history': [],
            'total_points': 0,
@@ -126,16 +237,37 @@ class UI:
            self.alg_frame,
            text="Minmax",
            variable=self.choice_alg,
-           value='Minmax algorithm'
+           value=MINIMAX
        )
        self.rbutton_alg_2 = ttk.Radiobutton(
            self.alg_frame,
            text="Alpha-Beta",
            variable=self.choice_alg,
-           value='Alfa-Beta algorithm'
+           value=ALPHA_BETA
+       )
+       self.rbutton_alg_4 = ttk.Radiobutton(
+           self.alg_frame,
+           text="PVS",
+           variable=self.choice_alg,
+           value=PVS
+       )
+       self.rbutton_alg_5 = ttk.Radiobutton(
+           self.alg_frame,
+           text="MCTS",
+           variable=self.choice_alg,
+           value=MCTS
+       )
+       self.rbutton_alg_3 = ttk.Radiobutton(
+           self.alg_frame,
+           text="Perfect",
+           variable=self.choice_alg,
+           value=PERFECT
        )
        self.rbutton_alg_1.pack(side=tk.LEFT, expand=True)
        self.rbutton_alg_2.pack(side=tk.LEFT, expand=True)
+       self.rbutton_alg_4.pack(side=tk.LEFT, expand=True)
+       self.rbutton_alg_5.pack(side=tk.LEFT, expand=True)
+       self.rbutton_alg_3.pack(side=tk.LEFT, expand=True)
 
 
        # Search depth frame
@@ -150,13 +282,31 @@ class UI:
        self.scale_depth = tk.Scale(
            self.depth_frame,
            from_=1,
-           to=5,
+           to=8,
            orient=tk.HORIZONTAL,
            length=180
        )
        self.scale_depth.pack()
 
 
+       # Time budget frame
+       self.budget_frame = ttk.LabelFrame(
+           self.main_frame,
+           text="Time budget, ms (0 = fixed depth):",
+           padding=(8, 4)
+       )
+       self.budget_frame.pack(fill=tk.X, pady=3)
+
+
+       self.budget_entry = ttk.Entry(
+           self.budget_frame,
+           textvariable=self.budget,
+           font=('Montserrat', 10),
+           width=8
+       )
+       self.budget_entry.pack()
+
+
        # Starting number frame
        self.num_frame = ttk.LabelFrame(
            self.main_frame,
@@ -214,6 +364,14 @@ class UI:
        self.label_info.pack()
 
 
+       self.label_progress = ttk.Label(
+           self.info_frame,
+           text="",
+           font=("Montserrat", 9)
+       )
+       self.label_progress.pack()
+
+
        # Move buttons frame
        self.button_frame = ttk.LabelFrame(
            self.main_frame,
@@ -295,6 +453,7 @@ class UI:
        """Displays complete game path and available moves"""
        # Use current game data if active, otherwise use last game data
        if self.game_active:
+           start_num = self.start_number
            current_num = self.current_number
            history = self.move_history
            points = self.total_points
@@ -303,6 +462,7 @@ class UI:
            if self.last_game_data['current_number'] == 0:
                messagebox.showwarning("Warning", "No completed game data available!")
                return
+           start_num = self.last_game_data['start_number']
            current_num = self.last_game_data['current_number']
            history = self.last_game_data['move_history']
            points = self.last_game_data['total_points']
@@ -312,7 +472,7 @@ class UI:
        # Create compact window
        tree_win = tk.Toplevel(self.root)
        tree_win.title("Game Tree")
-       tree_win.geometry("500x500")
+       tree_win.geometry("560x760")
 
 
        # Main container
@@ -348,29 +508,13 @@ class UI:
        history_text.pack(fill="x")
 
 
-       # Reconstruct game path
-       path = []
-       current = current_num
-       while current >= 20:  # Work backwards from current number
-           path.append(current)
-           # Find which move was used to reach current number
-           for move in [3, 4, 5]:
-               if current % move == 0:
-                   prev = current // move
-                   if prev >= 20:  # Valid previous number
-                       current = prev
-                       break
-           else:
-               break
-
-
-       # Display full path
-       if path:
-           path.reverse()  # Show from start to current
-           history_text.insert("end", f"Start → {path[0]}")
-           for i in range(1, len(path)):
-               move = path[i] // path[i - 1]
-               history_text.insert("end", f" (×{move}) → {path[i]}")
+       # Replay the game path from the start number
+       if history:
+           current = start_num
+           history_text.insert("end", f"Start → {current}")
+           for move in history:
+               current *= move['move']
+               history_text.insert("end", f" (×{move['move']}) → {current}")
        else:
            history_text.insert("end", "No moves recorded")
 
@@ -378,6 +522,23 @@ class UI:
        history_text.configure(state="disabled")
 
 
+       # Tree of the computer's latest search
+       search_frame = ttk.LabelFrame(main_frame, text="Last Search", padding=10)
+       search_frame.pack(fill="both", expand=True, pady=(0, 10))
+       if isinstance(self.engine, MonteCarloSearch):
+           view = SearchTreeView(search_frame, self.engine.root) if self.engine.root else None
+       elif self.engine.last_trace is not None:
+           trace = self.engine.last_trace
+           view = SearchTreeView(search_frame, trace.root, trace.notes, trace.best_moves)
+       else:
+           view = None
+       if view is not None:
+           view.pack(fill="both", expand=True)
+       else:
+           # Perfect play and opening book moves search no tree
+           ttk.Label(search_frame, text="The last computer move was not searched").pack()
+
+
        # Move history details
        moves_frame = ttk.LabelFrame(main_frame, text="Move Details", padding=10)
        moves_frame.pack(fill="both", expand=True)
@@ -385,7 +546,7 @@ class UI:
 
        moves_text = scrolledtext.ScrolledText(
            moves_frame,
-           height=8,
+           height=6,
            width=50,
            wrap=tk.WORD
        )
@@ -396,7 +557,25 @@ class UI:
            if 'algorithm' in move:  # Computer move
                moves_text.insert("end",
                                  f"Computer ({move['algorithm']}): ×{move['move']} "
-                                 f"(Nodes: {move['nodes_visited']}, Depth: {move.get('depth', 'N/A')})\n")
+                                 f"(Nodes: {move['nodes_visited']}, Depth: {move.get('depth', 'N/A')}, "
+                                 f"Pruned: {move.get('pruned_fraction', 0):.0%}, "
+                                 f"Time: {move.get('computation_time', 0) * 1000:.1f} ms)\n")
+               stats = move.get('stats')
+               if stats:
+                   moves_text.insert("end",
+                                     f"   Generated: {stats['generated']}, "
+                                     f"Evaluated: {stats['evaluated']} "
+                                     f"({stats.get('eval_hits', 0)} cached), "
+                                     f"Branching: {stats['branching_factor']:.2f}, "
+                                     f"Table hits: {stats['table_hits']}/{stats['table_probes']}\n"
+                                     f"   Eval: {stats['eval_time'] * 1000:.2f} ms, "
+                                     f"Build: {stats['build_time'] * 1000:.2f} ms, "
+                                     f"Cutoffs by depth: {stats['cutoffs'] or 'none'}\n")
+                   if stats.get('reused'):
+                       moves_text.insert("end", f"   Reused from the previous move: "
+                                                f"{stats['reused']}\n")
+               elif 'stats' in move:
+                   moves_text.insert("end", "   From the opening book\n")
            else:  # Human move
                moves_text.insert("end", f"Human: ×{move['move']}\n")
 
@@ -404,7 +583,21 @@ class UI:
        moves_text.configure(state="disabled")
 
 
-       ttk.Button(main_frame, text="Close", command=tree_win.destroy).pack(pady=(10, 0))
+       buttons_frame = ttk.Frame(main_frame)
+       buttons_frame.pack(pady=(10, 0))
+       ttk.Button(buttons_frame, text="Export history",
+                  command=lambda: self.export_history(history)).pack(side="left", padx=5)
+       ttk.Button(buttons_frame, text="Close", command=tree_win.destroy).pack(side="left", padx=5)
+
+
+   def export_history(self, history):
+       """Save the move history, search stats included, as JSON"""
+       path = filedialog.asksaveasfilename(defaultextension=".json",
+                                           filetypes=[("JSON", "*.json")])
+       if not path:
+           return
+       with open(path, 'w') as f:
+           json.dump(history, f, indent=2)
 
 
    def update_ui(self):
@@ -449,15 +642,27 @@ class UI:
 
    def start_game(self):
        num = self.num.get()
-       if 20 <= num <= 30 and self.choice_player.get() != " " and self.choice_alg.get() != " ":
+       budget = self.budget.get()
+       if 20 <= num <= 30 and budget >= 0 and self.choice_player.get() != " " \
+               and self.choice_alg.get() != " ":
            self.current_number = num
+           self.start_number = num
            self.total_points = 0
            self.game_bank = 0
            self.depth = self.scale_depth.get()
+           self.time_budget = budget
            self.player = self.choice_player.get()
            self.alg = self.choice_alg.get()
            self.nodes_visited = 0
            self.move_history = []
+           self.log.start_game(num, self.player, self.alg, self.depth, budget)
+           # Table and history heuristic, or the MCTS tree, persist for the whole game
+           if self.alg == MCTS:
+               self.engine = MonteCarloSearch(workers=MCTS_WORKERS)
+               self.engine.start_pool()  # Here on the Tk thread, not from the search thread
+           else:
+               self.engine = SearchEngine(TranspositionTable(), ordering=ORDERINGS, timed=True,
+                                          trace=True)
 
 
            self.game_active = True
@@ -466,17 +671,31 @@ class UI:
 
 
            if self.player == "Computer":
-               self.root.after(1000, self.play_turn_comp)
+               self.schedule_turn_comp()
        else:
-           messagebox.showerror("Error", "You must enter a number between 20 and 30\n"
+           messagebox.showerror("Error", "You must enter a number between 20 and 30,\n"
+                                         "a time budget of 0 or more\n"
                                          "and select a player and algorithm.")
 
 
    def reset_game(self):
-       # Store the game data before resetting
+       # Abort a computer move that is still scheduled or being searched
+       if self.turn_timer is not None:
+           self.root.after_cancel(self.turn_timer)
+           self.turn_timer = None
+       self.thinking = False
+       self.engine.cancel()
+       if isinstance(self.engine, MonteCarloSearch):
+           self.engine.close()
+       self.label_progress.config(text="")
+       self.log.end_game()  # Logged as abandoned unless end_game already closed it
+
+
+       # Store the game data before resetting; start_game gives the next game a new history list
        self.last_game_data = {
+           'start_number': self.start_number,
            'current_number': self.current_number,
-           'move_history': self.move_history.copy(),
+           'move_history': self.move_history,
            'total_points': self.total_points,
            'game_bank': self.game_bank
        }
@@ -497,7 +716,7 @@ class UI:
    def play_turn_player(self, option):
        if self.player == 'Human':
            new_value = self.current_number * option
-           self.move_history.append({
+           self.record_move({
                'player': 'Human',
                'move': option
            })
@@ -505,158 +724,128 @@ class UI:
            self.apply_move(new_value)
 
 
-   def generate_game_tree(self, current_node, depth):
-       """Recursively generate game tree to specified depth"""
-       if depth == 0 or current_node.is_terminal():
-           current_node.terminal = current_node.is_terminal()
-           return
-
-
-       for move in [3, 4, 5]:
-           new_value = current_node.value * move
-           child_node = GameTreeNode(new_value, current_node, move)
-           current_node.add_child(child_node)
-           self.nodes_visited += 1  # Track nodes visited
-           self.generate_game_tree(child_node, depth - 1)
-
-
-   def evaluate_state(self, node):
-
-
-       # Primary factors
-       parity = 2 if node.value % 2 == 0 else -2  # Stronger emphasis on even/odd
-       bank = 1.5 if node.value % 5 == 0 else 0  # Higher bank bonus
-
-
-       # Terminal states
-       if node.is_terminal():
-           return float('inf') if (self.total_points + parity / 2) % 2 == 0 else float('-inf')
+   def schedule_turn_comp(self):
+       self.turn_timer = self.root.after(1000, self.play_turn_comp)
 
 
-       # Strategic factors
-       danger = node.value / 3000  # Linear danger increase
-       options = sum(1 for m in [3, 4, 5] if node.value * m < 3000)  # Safe moves remaining
-
-
-       # Composite evaluation
-       return (parity + bank - danger * 10 + options * 0.5)
+   def play_turn_comp(self):
+       self.turn_timer = None
+       if not self.game_active or self.player != "Computer" or self.thinking:
+           return
 
 
-   def minimax(self, node, depth, maximizing):
-       if depth == 0 or node.is_terminal():
-           node.score = self.evaluate_state(node)
-           return node.score
+       state = GameState(self.current_number, self.total_points, self.game_bank,
+                         self.player, self.choice_player.get())
+       result = self.book_move(state)
+       if result is not None:
+           self.finish_turn_comp(result)
+           return
 
 
-       if maximizing:
-           max_eval = float('-inf')
-           for child in node.children:
-               eval = self.minimax(child, depth - 1, False)
-               max_eval = max(max_eval, eval) if eval is not None else max_eval
-           node.score = max_eval
-           return max_eval
-       else:
-           min_eval = float('inf')
-           for child in node.children:
-               eval = self.minimax(child, depth - 1, True)
-               min_eval = min(min_eval, eval) if eval is not None else min_eval
-           node.score = min_eval
-           return min_eval
-
-
-   def alpha_beta(self, node, depth, alpha, beta, maximizing):
-       if depth == 0 or node.is_terminal():
-           node.score = self.evaluate_state(node)
-           return node.score
-
-
-       if maximizing:
-           value = float('-inf')
-           for child in node.children:
-               child_value = self.alpha_beta(child, depth - 1, alpha, beta, False)
-               if child_value is not None:
-                   value = max(value, child_value)
-                   alpha = max(alpha, value)
-                   if alpha >= beta:
-                       break
-           node.score = value
-           return value
-       else:
-           value = float('inf')
-           for child in node.children:
-               child_value = self.alpha_beta(child, depth - 1, alpha, beta, True)
-               if child_value is not None:
-                   value = min(value, child_value)
-                   beta = min(beta, value)
-                   if alpha >= beta:
-                       break
-           node.score = value
-           return value
+       self.thinking = True
+       threading.Thread(
+           target=self.search_worker,
+           args=(self.engine, state, self.alg, self.depth, self.time_budget),
+           daemon=True
+       ).start()
+       self.root.after(50, self.poll_search, self.engine)
 
 
-   def play_turn_comp(self):
-       if not self.game_active or self.player != "Computer":
-           return
+   def book_move(self, state):
+       """Result for the position from the opening book, or None if it has to be searched"""
+       # Timed searches pick their own depth, perfect play needs no book and MCTS has no depth
+       if self.book is None or self.time_budget > 0 or self.alg in (PERFECT, MCTS):
+           return None
 
 
        start_time = time.time()
-       self.nodes_visited = 0
-
-
-       # Create root node
-       root_node = GameTreeNode(self.current_number)
+       entry = self.book.lookup(state.value, state.points, state.bank,
+                                state.player == state.first_player, self.depth)
+       if entry is None:
+           return None
+       move, score = entry
+       # The panel of the last search must not show a search made for an earlier move
+       self.engine.last_trace = None
+       return SearchResult(move, state.value * move, score, 0, time.time() - start_time, None,
+                           self.depth)
+
+
+   def search_worker(self, engine, state, alg, depth, time_budget):
+       """Runs in a background thread, so it must not touch any Tk widget"""
+       try:
+           if time_budget > 0:
+               result = engine.iterative_deepening(state, alg, time_budget)
+           else:
+               result = engine.choose_move(state, depth, alg)
+       except SearchCancelled:
+           result = None
+       except Exception as e:  # Reported by poll_search, the thread must not die silently
+           result = e
+       self.search_results.put((engine, result))
 
 
-       # Generate game tree
-       self.generate_game_tree(root_node, self.depth)
+   def poll_search(self, engine):
+       if engine is not self.engine:
+           return  # The game was restarted, its search has been cancelled
 
 
-       # Run algorithm
-       if self.alg == 'Minmax algorithm':
-           self.minimax(root_node, self.depth, True)
-       else:
-           self.alpha_beta(root_node, self.depth, float('-inf'), float('inf'), True)
+       while True:
+           try:
+               source, result = self.search_results.get_nowait()
+           except queue.Empty:
+               self.label_progress.config(text=f"Computer is thinking... {engine.progress()} nodes")
+               self.root.after(50, self.poll_search, engine)
+               return
+           if source is engine:
+               break  # Results of cancelled searches are dropped
 
 
-       # Find best move - handle None scores
-       best_move = None
-       best_score = float('-inf')
-       for child in root_node.children:
-           # Only consider children with calculated scores
-           if child.score is not None:
-               if child.score > best_score or best_move is None:
-                   best_score = child.score
-                   best_move = child.value
+       self.thinking = False
+       self.label_progress.config(text="")
+       if isinstance(result, Exception):
+           messagebox.showerror("Error", f"The computer's search failed:\n"
+                                         f"{type(result).__name__}: {result}")
+           self.reset_game()
+       elif result is not None and self.game_active:
+           self.finish_turn_comp(result)
 
 
-       # If no valid move found (shouldn't happen), pick first child
-       if best_move is None and root_node.children:
-           best_move = root_node.children[0].value
-           best_score = root_node.children[0].score if root_node.children[0].score is not None else 0
+   def finish_turn_comp(self, result):
+       if not self.game_active or self.player != "Computer":
+           return  # A result for a turn that is already over
 
 
-       self.computation_time = time.time() - start_time
+       self.nodes_visited = result.nodes_visited
+       self.computation_time = result.computation_time
 
 
        # Record move information
-       self.move_history.append({
+       self.record_move({
            'player': 'Computer',
            'algorithm': self.alg,
            'nodes_visited': self.nodes_visited,
-           'move': best_move // self.current_number,
-           'depth': self.depth
+           'move': result.move,
+           'depth': result.depth,
+           'pruned_fraction': result.pruned_fraction,
+           'computation_time': self.computation_time,
+           'stats': result.stats.as_dict() if result.stats is not None else None
        })
 
 
        self.update_history_display()
 
 
-       if best_move is not None:
-           self.apply_move(best_move)
+       if result.value is not None:
+           self.apply_move(result.value)
        else:
            self.end_game()
 
 
+   def record_move(self, move):
+       self.move_history.append(move)
+       self.log.record_move(move)
+
+
    def apply_move(self, new_state):
        if not self.game_active:
            return
@@ -677,14 +866,13 @@ class UI:
 
 
        if self.player == "Computer" and self.game_active:
-           self.root.after(1000, self.play_turn_comp)
+           self.schedule_turn_comp()
 
 
    def end_game(self):
-       final_points = self.total_points - self.game_bank \
-           if self.total_points % 2 == 0 else self.total_points + self.game_bank
-       winner = self.choice_player.get() if final_points % 2 == 0 \
-           else "Computer" if self.choice_player.get() == "Human" else "Human"
+       final_points = final_score(self.total_points, self.game_bank)
+       game_winner = winner(self.total_points, self.game_bank, self.choice_player.get())
+       self.log.end_game(final_points, game_winner)
 
 
        # Calculate total nodes visited
@@ -696,7 +884,7 @@ class UI:
                            f"Points before bank: {self.total_points}\n"
                            f"Bank points: {self.game_bank}\n"
                            f"Final score: {final_points}\n"
-                           f"Winner: {winner}\n\n"
+                           f"Winner: {game_winner}\n\n"
                            f"AI Statistics:\n"
                            f"Total nodes visited: {total_nodes}")
        self.button_start.config(state=tk.NORMAL)
@@ -709,4 +897,5 @@ if __name__ == "__main__":
    root = tk.Tk()
    game = UI(root)
    root.mainloop()
+   game.log.close()
 
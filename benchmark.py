@@ -0,0 +1,259 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+
+from engine import GameTreeNode, GameState, SearchEngine, MINIMAX, ALPHA_BETA, PVS, ORDERINGS, np
+from parallel import ParallelSearch
+from rules import TARGET
+from transposition import TranspositionTable
+
+
+
+
+_parallel = None  # Shared by every parallel measurement, starting a pool per search would swamp it
+
+
+
+
+def parallel_engine():
+   global _parallel
+   if _parallel is None:
+       _parallel = ParallelSearch()
+   return _parallel
+
+
+
+
+ENGINES = {
+   'tree': lambda: SearchEngine(lazy=False),  # Build the whole tree, then search it
+   'lazy': lambda: SearchEngine(),  # Generate children on demand
+   'tuned': lambda: SearchEngine(TranspositionTable(), ordering=ORDERINGS),  # As used by the UI
+   'stack': lambda: SearchEngine(stack=True),  # Explicit ply stack instead of recursion
+   'parallel': parallel_engine  # Root splitting over a process pool
+}
+if np is not None:
+   ENGINES['batch'] = lambda: SearchEngine(batch=True)  # NumPy levels for minimax
+ALGORITHMS = {
+   'minimax': MINIMAX,
+   'alphabeta': ALPHA_BETA,
+   'pvs': PVS
+}
+
+TIME_TOLERANCE = 0.5  # Allowed relative latency increase before it counts as a regression
+TIME_FLOOR_MS = 0.5  # Latency differences below this are treated as noise
+
+
+
+
+class DictGameTreeNode:
+   """GameTreeNode as it was before __slots__, attributes kept in a per-instance __dict__"""
+
+   def __init__(self, value, parent=None, move=None, points=0, bank=0):
+       self.value = value
+       self.parent = parent
+       self.move = move
+       self.points = points
+       self.bank = bank
+       self.children = []
+       self.score = None
+       self.terminal = False
+
+
+   def add_child(self, child_node):
+       self.children.append(child_node)
+
+
+   def is_terminal(self):
+       return self.value >= TARGET
+
+
+
+
+def tree_memory(node_class, depth, start=1):
+   """Build a full tree with node_class and return (nodes, traced bytes)"""
+   engine = SearchEngine(lazy=False)
+   engine.node_class = node_class
+
+
+   tracemalloc.start()
+   root = node_class(start)
+   engine.generate_game_tree(root, depth)
+   size, _ = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+   return engine.nodes_visited + 1, size
+
+
+def memory_report(depths, start=1):
+   """Bytes per node of the dict-based and slotted GameTreeNode layouts"""
+   rows = []
+   for depth in depths:
+       nodes, before = tree_memory(DictGameTreeNode, depth, start)
+       _, after = tree_memory(GameTreeNode, depth, start)
+       rows.append({
+           'depth': depth,
+           'nodes': nodes,
+           'bytes_per_node_dict': round(before / nodes, 1),
+           'bytes_per_node_slots': round(after / nodes, 1)
+       })
+   return rows
+
+
+def percentile(samples, fraction):
+   ordered = sorted(samples)
+   return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure_search(engine_name, algorithm, start, depth, repeats):
+   """Time `repeats` searches of one position, each on a fresh engine, then trace its memory once"""
+   latencies = []
+   for _ in range(repeats):
+       engine = ENGINES[engine_name]()
+       begin = time.perf_counter()
+       result = engine.choose_move(GameState(start), depth, ALGORITHMS[algorithm])
+       latencies.append((time.perf_counter() - begin) * 1000)
+
+
+   engine = ENGINES[engine_name]()
+   tracemalloc.start()
+   engine.choose_move(GameState(start), depth, ALGORITHMS[algorithm])
+   _, peak = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+
+
+   p50 = percentile(latencies, 0.5)
+   return {
+       'engine': engine_name,
+       'algorithm': algorithm,
+       'start': start,
+       'depth': depth,
+       'move': result.move,
+       'nodes': result.nodes_visited,
+       'nodes_per_second': round(result.nodes_visited / (p50 / 1000)) if p50 else None,
+       'p50_ms': round(p50, 4),
+       'p99_ms': round(percentile(latencies, 0.99), 4),
+       'peak_bytes': peak
+   }
+
+
+def search_report(engines, algorithms, starts, depths, repeats):
+   rows = []
+   for engine_name in engines:
+       for algorithm in algorithms:
+           if not ENGINES[engine_name]().supports(ALGORITHMS[algorithm]):
+               continue  # e.g. PVS on the explicit-stack engine
+           for depth in depths:
+               for start in starts:
+                   rows.append(measure_search(engine_name, algorithm, start, depth, repeats))
+   return {
+       'python': platform.python_version(),
+       'machine': platform.machine(),
+       'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+       'repeats': repeats,
+       'rows': rows
+   }
+
+
+def row_key(row):
+   return row['engine'], row['algorithm'], row['start'], row['depth']
+
+
+def compare(report, baseline):
+   """Return a list of regression messages against a stored baseline report"""
+   previous = {row_key(row): row for row in baseline['rows']}
+   problems = []
+   latency = {}  # (engine, algorithm, depth) -> summed p50 now and in the baseline
+   for row in report['rows']:
+       old = previous.get(row_key(row))
+       if old is None:
+           continue
+       name = "{}/{} start={} depth={}".format(*row_key(row))
+       if row['nodes'] > old['nodes']:
+           problems.append(f"{name}: nodes {old['nodes']} -> {row['nodes']}")
+       if row['move'] != old['move']:
+           problems.append(f"{name}: move {old['move']} -> {row['move']}")
+       key = (row['engine'], row['algorithm'], row['depth'])
+       now, before = latency.get(key, (0, 0))
+       latency[key] = (now + row['p50_ms'], before + old['p50_ms'])
+
+
+   # Single positions take well under a millisecond, so timings are compared per depth
+   for (engine_name, algorithm, depth), (now, before) in latency.items():
+       if now - before > TIME_FLOOR_MS and now > before * (1 + TIME_TOLERANCE):
+           problems.append(f"{engine_name}/{algorithm} depth={depth}: "
+                           f"p50 sum {before:.3f} ms -> {now:.3f} ms")
+   return problems
+
+
+def print_summary(report):
+   totals = {}
+   for row in report['rows']:
+       key = (row['engine'], row['algorithm'], row['depth'])
+       nodes, p50s, p99 = totals.get(key, (0, [], 0))
+       totals[key] = (nodes + row['nodes'], p50s + [row['p50_ms']], max(p99, row['p99_ms']))
+
+
+   print(f"{'engine':>8} {'algorithm':>10} {'depth':>5} {'nodes':>8} {'mean p50 ms':>12} "
+         f"{'max p99 ms':>11}")
+   for (engine_name, algorithm, depth), (nodes, p50s, p99) in totals.items():
+       print(f"{engine_name:>8} {algorithm:>10} {depth:>5} {nodes:>8} "
+             f"{sum(p50s) / len(p50s):>12.4f} {p99:>11.4f}")
+
+
+def main():
+   parser = argparse.ArgumentParser(description="Search engine benchmarks")
+   commands = parser.add_subparsers(dest='command', required=True)
+
+
+   memory = commands.add_parser('memory', help="Bytes per GameTreeNode before and after __slots__")
+   memory.add_argument('--depths', type=int, nargs='+', default=[5, 6, 7, 8])
+   memory.add_argument('--start', type=int, default=1,
+                       help="Root number; small values keep deep trees from ending early")
+
+
+   search = commands.add_parser('search', help="Node counts, throughput, latency and peak memory")
+   search.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+   search.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS),
+                       default=list(ALGORITHMS))
+   search.add_argument('--starts', type=int, nargs='+', default=list(range(20, 31)))
+   search.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3, 4, 5])
+   search.add_argument('--repeats', type=int, default=50, help="Timed searches per position")
+   search.add_argument('--output', default='bench_results.json', help="Where to write results")
+   search.add_argument('--baseline', help="Compare against this stored results file")
+   search.add_argument('--save-baseline', metavar='PATH', help="Also store the results as a baseline")
+
+
+   args = parser.parse_args()
+   if args.command == 'search':
+       report = search_report(args.engines, args.algorithms, args.starts, args.depths,
+                              args.repeats)
+       with open(args.output, 'w') as f:
+           json.dump(report, f, indent=1)
+       if args.save_baseline:
+           with open(args.save_baseline, 'w') as f:
+               json.dump(report, f, indent=1)
+       print_summary(report)
+
+
+       if args.baseline:
+           with open(args.baseline) as f:
+               problems = compare(report, json.load(f))
+           for problem in problems:
+               print("REGRESSION", problem)
+           if problems:
+               sys.exit(1)
+           print("No regressions against", args.baseline)
+   elif args.command == 'memory':
+       print(f"{'depth':>5} {'nodes':>8} {'dict B/node':>12} {'slots B/node':>13}")
+       for row in memory_report(args.depths, args.start):
+           print(f"{row['depth']:>5} {row['nodes']:>8} {row['bytes_per_node_dict']:>12} "
+                 f"{row['bytes_per_node_slots']:>13}")
+
+
+
+
+if __name__ == "__main__":
+   main()
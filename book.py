@@ -0,0 +1,151 @@
+import argparse
+import bisect
+import hashlib
+import inspect
+import mmap
+import os
+import struct
+import sys
+
+
+from encoding import VALUE_SHIFT, pack, unpack, make
+from engine import GameState, SearchEngine, MINIMAX
+from rules import TARGET, MOVES, HUMAN, COMPUTER
+
+
+
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+MAGIC = b'K7BK'
+VERSION = 2
+HEADER = struct.Struct('<4sHI8sBB')  # magic, version, records, evaluation fingerprint, plies, depth
+RECORD = struct.Struct('<QdB')  # state key, score, best move
+
+
+
+
+def fingerprint():
+   """Changes whenever the evaluation or the game constants change, which makes a book stale"""
+   source = inspect.getsource(SearchEngine.evaluate) + repr((TARGET, MOVES))
+   return hashlib.sha1(source.encode()).digest()[:8]
+
+
+def book_key(value, points, bank, mover_first, depth):
+   """Packed position of the side to move, which searches as the maximizer; sorting by it keeps
+   the file binary-searchable
+   """
+   return pack(value, points, bank, True, mover_first, depth)
+
+
+
+
+class OpeningBook:
+   """Read-only view of a book file through mmap, records are looked up by binary search"""
+
+   def __init__(self, path=BOOK_PATH):
+       self.file = open(path, 'rb')
+       try:
+           self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+       except ValueError:  # Empty file
+           self.file.close()
+           raise ValueError(f"{path} is not an opening book")
+
+
+       magic, version, self.count, digest, self.plies, self.depth = HEADER.unpack_from(self.data)
+       if magic != MAGIC or version != VERSION:
+           self.close()
+           raise ValueError(f"{path} is not an opening book")
+       if digest != fingerprint():
+           self.close()
+           raise ValueError(f"{path} was built for a different evaluate_state, rebuild it")
+
+
+   def __len__(self):
+       return self.count
+
+
+   def key_at(self, index):
+       return struct.unpack_from('<Q', self.data, HEADER.size + index * RECORD.size)[0]
+
+
+   def lookup(self, value, points, bank, mover_first, depth):
+       """Return (move, score) for a position searched to depth, or None if it is not in the book"""
+       key = book_key(value, points, bank, mover_first, depth)
+       index = bisect.bisect_left(range(self.count), key, key=self.key_at)
+       if index == self.count or self.key_at(index) != key:
+           return None
+       _, score, move = RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+       return move, score
+
+
+   def close(self):
+       self.data.close()
+       self.file.close()
+
+
+
+
+def load_book(path=BOOK_PATH):
+   """The opening book at path, or None when it is missing or stale"""
+   if not os.path.exists(path):
+       return None
+   try:
+       return OpeningBook(path)
+   except ValueError:
+       return None
+
+
+def reachable_states(plies, starts=range(20, 31)):
+   """Non-terminal (value, points, bank, mover_first) positions within `plies` moves of a start"""
+   states = set()
+   for start in starts:
+       frontier = {pack(start, 0, 0)}
+       for ply in range(plies + 1):
+           # Moves alternate, so the first player is to move after an even number of plies
+           states.update(unpack(key)[:3] + (ply % 2 == 0,) for key in frontier)
+           frontier = {
+               make(key, move)
+               for key in frontier
+               for move in MOVES
+               if (key >> VALUE_SHIFT) * move < TARGET
+           }
+   return states
+
+
+def build_book(path=BOOK_PATH, plies=4, depth=5):
+   """Search every position within `plies` moves of each start at depths 1..depth and store it"""
+   records = []
+   for value, points, bank, mover_first in reachable_states(plies):
+       # Both sides search as the maximizer; only whether they moved first matters
+       state = GameState(value, points, bank, COMPUTER, COMPUTER if mover_first else HUMAN)
+       for search_depth in range(1, depth + 1):
+           result = SearchEngine().choose_move(state, search_depth, MINIMAX)
+           records.append((book_key(value, points, bank, mover_first, search_depth),
+                           result.score, result.move))
+   records.sort()
+
+
+   with open(path, 'wb') as f:
+       f.write(HEADER.pack(MAGIC, VERSION, len(records), fingerprint(), plies, depth))
+       for record in records:
+           f.write(RECORD.pack(*record))
+   return len(records)
+
+
+def main():
+   parser = argparse.ArgumentParser(description="Build the opening book used by the computer player")
+   parser.add_argument('--plies', type=int, default=4, help="Moves from the start to cover")
+   parser.add_argument('--depth', type=int, default=5, help="Deepest search depth to store")
+   parser.add_argument('--output', default=BOOK_PATH)
+   args = parser.parse_args()
+
+
+   count = build_book(args.output, args.plies, args.depth)
+   print(f"Wrote {count} positions to {args.output}", file=sys.stderr)
+
+
+
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,57 @@
+# A position packs into one int, low bits first:
+#   bit 0       root_first, whether the maximizer started the game
+#   bit 1       maximizing, whether the maximizer is to move
+#   bits 2-9    remaining search depth up to 255, 0 outside searches
+#   bits 10-17  bank
+#   bits 18-25  points + POINTS_OFFSET
+#   bits 26-    value
+# The search engine carries these keys through its lazy searches, stepping along moves with
+# make() and unmake(). Search scores depend on the points only through their parity, so its
+# transposition table and move hints key a position by key & PARITY_MASK, the same key with the
+# points bits above the lowest cleared (POINTS_OFFSET is even, so that bit is the points parity).
+DEPTH_SHIFT = 2
+BANK_SHIFT = 10
+POINTS_SHIFT = 18
+VALUE_SHIFT = 26
+FIELD_MASK = 0xFF
+POINTS_OFFSET = 128  # Keeps negative points positive inside the key
+
+ROOT_FIRST_BIT = 1
+MAXIMIZING_BIT = 2
+POINTS_ONE = 1 << POINTS_SHIFT
+BANK_ONE = 1 << BANK_SHIFT
+PARITY_MASK = ~((FIELD_MASK ^ 1) << POINTS_SHIFT)
+# Points and bank change of a move, by the new value's last digit, as advance() computes it
+STEPS = tuple((POINTS_ONE if digit % 2 == 0 else -POINTS_ONE) + (BANK_ONE if digit % 5 == 0 else 0)
+              for digit in range(10))
+
+
+
+
+def pack(value, points, bank, maximizing=False, root_first=False, depth=0):
+   """Packed int for a position; equal positions always give the same int"""
+   return (value << VALUE_SHIFT | (points + POINTS_OFFSET) << POINTS_SHIFT | bank << BANK_SHIFT
+           | depth << DEPTH_SHIFT | maximizing << 1 | root_first)
+
+
+def unpack(key):
+   """Return (value, points, bank, maximizing, root_first, depth) of a packed position"""
+   return (key >> VALUE_SHIFT,
+           (key >> POINTS_SHIFT & FIELD_MASK) - POINTS_OFFSET,
+           key >> BANK_SHIFT & FIELD_MASK,
+           bool(key & MAXIMIZING_BIT),
+           bool(key & ROOT_FIRST_BIT),
+           key >> DEPTH_SHIFT & FIELD_MASK)
+
+
+def make(key, move):
+   """Position after move, with points and bank updated as advance() does and the side flipped"""
+   value = key >> VALUE_SHIFT
+   new_value = value * move
+   return (key + ((new_value - value) << VALUE_SHIFT) + STEPS[new_value % 10]) ^ MAXIMIZING_BIT
+
+
+def unmake(key, move):
+   """Inverse of make(key, move)"""
+   value = key >> VALUE_SHIFT
+   return (key - STEPS[value % 10] - ((value - value // move) << VALUE_SHIFT)) ^ MAXIMIZING_BIT
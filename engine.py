@@ -0,0 +1,1305 @@
+import contextlib
+import cProfile
+import io
+import math
+import pstats
+import threading
+import time
+
+
+try:
+   import numpy as np
+except ImportError:  # Only needed for batch evaluation
+   np = None
+
+
+from encoding import VALUE_SHIFT, POINTS_SHIFT, BANK_SHIFT, DEPTH_SHIFT, POINTS_OFFSET, \
+   FIELD_MASK, MAXIMIZING_BIT, PARITY_MASK, pack, unpack, make, unmake
+from rules import TARGET, MOVES, COMPUTER, advance, max_plies, final_score
+from solver import get_solver
+from transposition import EXACT, LOWER, UPPER
+
+
+
+
+MINIMAX = 'Minmax algorithm'
+ALPHA_BETA = 'Alfa-Beta algorithm'
+PVS = 'PVS algorithm'
+MCTS = 'Monte Carlo tree search'
+PERFECT = 'Perfect play'
+
+ORDERINGS = ('table', 'killer', 'history', 'static')  # Move ordering heuristics for alpha-beta
+
+MAX_DEPTH = 32  # Deepest iteration tried by iterative deepening
+CLOCK_CHECK = 64  # Nodes between deadline and cancellation checks
+ASPIRATION_WINDOW = 1.0  # Half-width of the PVS root window around the previous score
+
+
+
+
+class GameTreeNode:
+   __slots__ = ('value', 'parent', 'move', 'points', 'bank', 'children', 'score', 'terminal')
+
+   def __init__(self, value, parent=None, move=None, points=0, bank=0):
+       self.value = value  # The current number in the game
+       self.parent = parent  # Parent node
+       self.move = move  # The move (3, 4, or 5) that led to this node
+       self.points = points  # Total points after the move
+       self.bank = bank  # Game bank after the move
+       self.children = []  # Child nodes
+       self.score = None  # Heuristic score
+       self.terminal = False  # Whether this is an end state
+
+
+   def add_child(self, child_node):
+       self.children.append(child_node)
+
+
+   def is_terminal(self):
+       """Check if this node represents an end game state"""
+       return self.value >= TARGET
+
+
+
+
+class GameState:
+   def __init__(self, value, points=0, bank=0, player=COMPUTER, first_player=COMPUTER):
+       self.value = value  # The current number in the game
+       self.points = points  # Total points
+       self.bank = bank  # Game bank
+       self.player = player  # Side to move
+       self.first_player = first_player  # Side that started the game
+
+
+
+
+class SearchTimeout(Exception):
+   """Raised inside a search once its time budget has run out"""
+
+
+
+
+class SearchCancelled(Exception):
+   """Raised out of a search that was aborted with SearchEngine.cancel"""
+
+
+
+
+class SearchStats:
+   """Counters and timings collected during one search"""
+
+   def __init__(self):
+       self.generated = 0  # Child positions created
+       self.expanded = 0  # Positions whose children were generated
+       self.evaluated = 0  # Positions scored by the evaluation function
+       self.eval_hits = 0  # Of those, scores found in the evaluation cache
+       self.cutoffs = {}  # Remaining depth -> alpha-beta cutoffs there
+       self.table_probes = 0  # Transposition table lookups
+       self.table_hits = 0  # Lookups whose score could be used without searching
+       self.eval_time = 0.0  # Seconds spent evaluating positions, if the engine is timed
+       self.build_time = 0.0  # Seconds spent generating children, if the engine is timed
+       # Work kept from the previous move's search: nodes of a re-rooted GameTreeNode tree, or
+       # playouts already under the MCTS root
+       self.reused = 0
+       self.profile = None  # Report left by a profiler hook
+
+
+   def branching_factor(self):
+       """Average number of children generated per expanded position"""
+       return self.generated / self.expanded if self.expanded else 0.0
+
+
+   def as_dict(self):
+       return {
+           'generated': self.generated,
+           'expanded': self.expanded,
+           'evaluated': self.evaluated,
+           'eval_hits': self.eval_hits,
+           'cutoffs': dict(sorted(self.cutoffs.items())),
+           'table_probes': self.table_probes,
+           'table_hits': self.table_hits,
+           'branching_factor': round(self.branching_factor(), 3),
+           'eval_time': self.eval_time,
+           'build_time': self.build_time,
+           'reused': self.reused,
+           'profile': self.profile
+       }
+
+
+
+
+@contextlib.contextmanager
+def cprofile_hook(stats, limit=20):
+   """Profiler hook for SearchEngine: run the search under cProfile, report in stats.profile"""
+   profile = cProfile.Profile()
+   profile.enable()
+   try:
+       yield
+   finally:
+       profile.disable()
+       report = io.StringIO()
+       pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(limit)
+       stats.profile = report.getvalue()
+
+
+
+
+class EvaluationCache:
+   """Scores of evaluate() for every value below limit, filled in as positions are first seen.
+
+   evaluate() only depends on the value, the parity of points + bank and which side the
+   maximizer is, so each slot is indexed by ((value * 2) + parity) * 2 + root_first.
+   """
+
+   def __init__(self, limit=TARGET):
+       self.limit = limit
+       self.scores = [None] * (limit * 4)
+       self.hits = 0
+       self.misses = 0
+
+
+   def __len__(self):
+       return sum(1 for score in self.scores if score is not None)
+
+
+
+
+_evaluation_caches = {}  # evaluate function -> its EvaluationCache
+
+
+
+
+def evaluation_cache(evaluate):
+   """The cache shared by every engine scoring positions with this evaluate function"""
+   cache = _evaluation_caches.get(evaluate)
+   if cache is None:
+       cache = _evaluation_caches[evaluate] = EvaluationCache()
+   return cache
+
+
+
+
+class SearchTrace:
+   """GameTreeNode tree of the nodes a recursive lazy search visits, built as it runs"""
+
+   def __init__(self, state):
+       self.root = GameTreeNode(state.value, points=state.points, bank=state.bank)
+       self.path = [self.root]  # Nodes being searched, root first
+       self.notes = {}  # id(node) -> remark shown with the node
+       self.best_moves = {}  # id(node) -> move the search picked there
+
+
+   def enter(self, value, points, bank):
+       parent = self.path[-1]
+       node = GameTreeNode(value, parent, value // parent.value, points, bank)
+       for i, child in enumerate(parent.children):
+           if child.move == node.move:
+               # A PVS re-search replaces the null-window probe of the same child
+               parent.children[i] = node
+               self.notes[id(node)] = "searched again"
+               break
+       else:
+           parent.add_child(node)
+       self.path.append(node)
+
+
+   def leave(self, score, best_move=None, note=None):
+       """Close the current node with its score and return the score"""
+       node = self.path.pop()
+       node.score = score
+       if best_move is not None:
+           self.best_moves[id(node)] = best_move
+       if note is not None:
+           self.notes[id(node)] = note
+       return score
+
+
+   def prune(self, moves):
+       """Record the children of the current node that a cutoff skipped; they keep no score"""
+       node = self.path[-1]
+       present = {child.move for child in node.children}  # A re-searched root prunes again
+       for move in moves:
+           if move in present:
+               continue
+           value = node.value * move
+           node.add_child(GameTreeNode(value, node, move, *advance(node.points, node.bank, value)))
+
+
+
+
+class SearchResult:
+   def __init__(self, move, value, score, nodes_visited, computation_time, root, depth=None,
+                pruned_fraction=0.0, stats=None):
+       self.move = move  # Chosen multiplier (3, 4 or 5), None if no move was found
+       self.value = value  # Number reached after the chosen move
+       self.score = score  # Score of the chosen child
+       self.nodes_visited = nodes_visited  # Nodes generated during the search
+       self.computation_time = computation_time  # Seconds spent searching
+       self.root = root  # Root of the searched game tree, None for lazy searches
+       self.depth = depth  # Depth of the (deepest completed) search
+       self.pruned_fraction = pruned_fraction  # Share of children skipped by alpha-beta cutoffs
+       self.stats = stats  # SearchStats of the search
+
+
+
+
+class SearchEngine:
+   """Game tree search without any UI dependency"""
+
+   node_class = GameTreeNode  # Class used when a GameTreeNode tree is built
+
+   def __init__(self, table=None, lazy=True, ordering=(), batch=False, timed=False,
+                profiler=None, stack=False, trace=False):
+       for heuristic in ordering:
+           if heuristic not in ORDERINGS:
+               raise ValueError(f"Unknown move ordering: {heuristic}")
+       if batch and np is None:
+           raise ImportError("Batch evaluation requires numpy")
+       if stack and (table is not None or ordering):
+           raise ValueError("The explicit-stack search supports neither a table nor move ordering")
+       if stack and trace:
+           raise ValueError("Only the recursive search can be traced")
+
+       self.root_first = True  # Whether the side searched for (the maximizer) moved first
+       self.nodes_visited = 0
+       self.table = table  # Optional TranspositionTable, kept across moves
+       self.lazy = lazy  # Generate children on demand instead of building a GameTreeNode tree
+       self.batch = batch  # Run minimax level by level over NumPy arrays
+       self.deadline = None  # time.time() after which a search raises SearchTimeout
+       self.cancelled = threading.Event()  # Set from another thread to abort searches
+       self.nodes_before = 0  # Nodes of finished iterations in the current search
+       self.move_hints = None  # Best move per position from earlier iterations
+       self.ordering = tuple(ordering)  # Heuristics used to sort alpha-beta children, by priority
+       self.killers = {}  # Remaining depth -> moves that recently caused a cutoff there
+       self.history = {}  # (maximizing, move) -> cutoff credit, kept across moves
+       self.pruned = 0  # Children skipped by cutoffs in the current search
+       self.aspiration = None  # (root_first, score) of the latest PVS search, centres the next
+       self.tree = None  # (root_first, root) of the latest tree search, re-rooted by the next
+       self.stack = stack  # Search below the root with stack_search instead of recursion
+       # Leaf scores shared with other engines of the same class; None evaluates every time
+       self.eval_cache = evaluation_cache(type(self).evaluate)
+       self.plies = None  # Per-ply buffers of stack_search, allocated on first use
+       self.stats = SearchStats()  # Counters of the current search
+       self.timed = timed  # Also time evaluation and child generation, which slows the search
+       # Called with the SearchStats of each search, returns the context manager the search
+       # runs in; cprofile_hook or a sampling profiler wrapped the same way
+       self.profiler = profiler
+       # Record a SearchTrace of every recursive lazy search; last_trace keeps the latest one
+       # that completed
+       self.tracing = trace
+       self.trace = None
+       self.last_trace = None
+
+
+   def expand(self, node):
+       """Generate the children of a node"""
+       self.stats.expanded += 1
+       for move in MOVES:
+           started = time.perf_counter() if self.timed else None
+           new_value = node.value * move
+           points, bank = advance(node.points, node.bank, new_value)
+           node.add_child(self.node_class(new_value, node, move, points, bank))
+           if started is not None:
+               self.stats.build_time += time.perf_counter() - started
+           self.stats.generated += 1
+           self.nodes_visited += 1  # Track nodes visited
+           if self.nodes_visited % CLOCK_CHECK == 0:
+               self.check_clock()
+
+
+   def generate_game_tree(self, current_node, depth):
+       """Generate game tree to specified depth, depth first with an explicit stack"""
+       stack = [(current_node, depth)]
+       while stack:
+           node, remaining = stack.pop()
+           if remaining == 0 or node.is_terminal():
+               node.terminal = node.is_terminal()
+               continue
+
+
+           if not node.children:  # Nodes kept from an earlier search are already expanded
+               self.expand(node)
+           # Reversed so that children are expanded in move order, as the recursion did
+           stack.extend((child, remaining - 1) for child in reversed(node.children))
+
+
+   def successors(self, key, moves=MOVES):
+       """Yield (move, packed key of the child) for each move, one child at a time"""
+       self.stats.expanded += 1
+       for move in moves:
+           started = time.perf_counter() if self.timed else None
+           child = make(key, move)
+           if started is not None:
+               self.stats.build_time += time.perf_counter() - started
+           self.stats.generated += 1
+           self.nodes_visited += 1  # Track nodes visited
+           if self.nodes_visited % CLOCK_CHECK == 0:
+               self.check_clock()
+           yield move, child
+
+
+   def check_clock(self):
+       if self.cancelled.is_set():
+           raise SearchCancelled()
+       if self.deadline is not None and time.time() > self.deadline:
+           raise SearchTimeout()
+
+
+   def cancel(self):
+       """Abort the running search, and any later one until resume() is called; thread-safe"""
+       self.cancelled.set()
+
+
+   def resume(self):
+       self.cancelled.clear()
+
+
+   @contextlib.contextmanager
+   def instrument(self):
+       """Start fresh stats for a search, running it under the profiler hook if there is one"""
+       self.stats = SearchStats()
+       if self.profiler is None:
+           yield self.stats
+       else:
+           with self.profiler(self.stats):
+               yield self.stats
+
+
+   def progress(self):
+       """Nodes generated so far by the running search; safe to read from another thread"""
+       return self.nodes_before + self.nodes_visited
+
+
+   def hint(self, position):
+       """Best move found for this position_key by an earlier iteration, if any"""
+       if self.move_hints is None:
+           return None
+       return self.move_hints.get(position)
+
+
+   def remember(self, position, move):
+       if self.move_hints is not None:
+           self.move_hints[position] = move
+
+
+   @staticmethod
+   def promote(moves, first_move):
+       """Move first_move to the front of moves"""
+       if first_move is None or moves[0] == first_move:
+           return moves
+       return (first_move,) + tuple(m for m in moves if m != first_move)
+
+
+   def order_moves(self, key, depth, maximizing, table_move, hint):
+       """Sort the moves by the configured heuristics; an iterative deepening hint goes first"""
+       if not self.ordering:
+           return self.promote(MOVES, hint)
+
+
+       killers = self.killers.get(depth, ())
+       ranks = {}
+       for move in MOVES:
+           rank = []
+           for heuristic in self.ordering:
+               if heuristic == 'table':
+                   rank.append(0 if move == table_move else 1)
+               elif heuristic == 'killer':
+                   rank.append(0 if move in killers else 1)
+               elif heuristic == 'history':
+                   rank.append(-self.history.get((maximizing, move), 0))
+               else:
+                   score = self.key_score(make(key, move))
+                   rank.append(-score if maximizing else score)
+           ranks[move] = rank
+       return self.promote(tuple(sorted(MOVES, key=ranks.__getitem__)), hint)
+
+
+   @staticmethod
+   def pruned_fraction(pruned, generated):
+       """Share of children that cutoffs kept from being searched"""
+       total = pruned + generated
+       return pruned / total if total else 0.0
+
+
+   def record_cutoff(self, depth, maximizing, move, skipped):
+       self.pruned += skipped
+       self.stats.cutoffs[depth] = self.stats.cutoffs.get(depth, 0) + 1
+       if not self.ordering:
+           return
+
+
+       killers = self.killers.setdefault(depth, [])
+       if move not in killers:
+           killers.insert(0, move)
+           del killers[2:]
+       self.history[(maximizing, move)] = self.history.get((maximizing, move), 0) + depth * depth
+
+
+   def position_key(self, value, points, bank, maximizing):
+       """Table and move hint key of a position: its encoding.pack key & PARITY_MASK; an int is
+       hashed for free where a tuple is hashed item by item
+       """
+       # Scores are seen from the maximizer, so the key also says which side that is
+       return pack(value, points, bank, maximizing, self.root_first) & PARITY_MASK
+
+
+   def root_key(self, state):
+       """encoding.pack key of the root, where the side searched for (the maximizer) is to move;
+       the lazy searches carry it from move to move with make
+       """
+       return pack(state.value, state.points, state.bank, True, self.root_first)
+
+
+   def state_key(self, value, points, bank, depth, maximizing):
+       """Transposition key: the position key with the remaining depth"""
+       return self.position_key(value, points, bank, maximizing) | depth << DEPTH_SHIFT
+
+
+   def probe(self, key, alpha, beta):
+       """Return (usable table score or None, stored best move or None) for key"""
+       self.stats.table_probes += 1
+       entry = self.table.lookup(key)
+       if entry is None:
+           return None, None
+
+
+       score, flag, best_move = entry
+       if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+           self.stats.table_hits += 1
+           return score, best_move
+       return None, best_move
+
+
+   def reroot(self, state):
+       """Root for a tree search of state: the node reached in the previous tree, if any"""
+       if self.tree is not None and self.tree[0] == self.root_first:
+           # Our move and the reply lead two plies down. The root matches when the same position
+           # is searched again, e.g. after a move was taken back; the ply between, with the
+           # opponent to move, never matches a search for our side
+           frontier = [self.tree[1]]
+           for _ in range(3):
+               for node in frontier:
+                   if (node.value, node.points, node.bank) == (state.value, state.points,
+                                                               state.bank):
+                       node.parent = None  # The rest of the old tree can be freed
+                       node.move = None
+                       return node
+               frontier = [child for node in frontier for child in node.children]
+       return GameTreeNode(state.value, points=state.points, bank=state.bank)
+
+
+   @staticmethod
+   def tree_size(root):
+       size = 0
+       stack = [root]
+       while stack:
+           node = stack.pop()
+           size += 1
+           stack.extend(node.children)
+       return size
+
+
+   @staticmethod
+   def previous_order(children, maximizing):
+       """Children best first by the scores an earlier search left on them"""
+       if all(child.score is None for child in children):
+           return children
+       sign = -1 if maximizing else 1
+       return sorted(children, key=lambda child: (child.score is None,
+                                                  sign * child.score if child.score is not None
+                                                  else 0))
+
+
+   def probe_node(self, node, depth, alpha, beta, maximizing):
+       """Return a usable table score for node, or None"""
+       if self.table is None or node.parent is None:  # The root always needs its children scored
+           return None
+
+
+       score, _ = self.probe(self.state_key(node.value, node.points, node.bank, depth, maximizing),
+                             alpha, beta)
+       if score is not None:
+           node.score = score
+       return score
+
+
+   def bound_flag(self, value, alpha, beta):
+       if value <= alpha:
+           return UPPER
+       if value >= beta:
+           return LOWER
+       return EXACT
+
+
+   def best_child_move(self, node, maximizing):
+       scored = [child for child in node.children if child.score is not None]
+       if not scored:
+           return None
+       pick = max if maximizing else min
+       return pick(scored, key=lambda child: child.score).move
+
+
+   def evaluate_state(self, node):
+       return self.score(node.value, node.points, node.bank)
+
+
+   def score(self, value, points, bank):
+       """evaluate() for the search, counted (and timed) in the search stats"""
+       stats = self.stats
+       stats.evaluated += 1
+       if not self.timed:
+           # cached_evaluate inlined for the common case, leaf scoring is the hottest path
+           cache = self.eval_cache
+           if cache is not None and value < cache.limit:
+               score = cache.scores[(value << 1 | (points + bank) & 1) << 1 | self.root_first]
+               if score is not None:
+                   cache.hits += 1
+                   stats.eval_hits += 1
+                   return score
+           return self.cached_evaluate(value, points, bank)
+       started = time.perf_counter()
+       score = self.cached_evaluate(value, points, bank)
+       self.stats.eval_time += time.perf_counter() - started
+       return score
+
+
+   def key_score(self, key):
+       """score() of a packed position, read from the evaluation cache without unpacking it"""
+       if not self.timed:
+           cache = self.eval_cache
+           value = key >> VALUE_SHIFT
+           if cache is not None and value < cache.limit:
+               # Bit 0 of each shifted field is that of points + POINTS_OFFSET and of bank
+               parity = ((key >> POINTS_SHIFT) + (key >> BANK_SHIFT)) & 1
+               score = cache.scores[(value << 1 | parity) << 1 | self.root_first]
+               if score is not None:
+                   self.stats.evaluated += 1
+                   cache.hits += 1
+                   self.stats.eval_hits += 1
+                   return score
+       return self.score(key >> VALUE_SHIFT, (key >> POINTS_SHIFT & FIELD_MASK) - POINTS_OFFSET,
+                         key >> BANK_SHIFT & FIELD_MASK)
+
+
+   def cached_evaluate(self, value, points, bank):
+       """evaluate() through the evaluation cache; terminal positions are not cached"""
+       cache = self.eval_cache
+       if cache is None or value >= cache.limit:
+           return self.evaluate(value, points, bank)
+
+
+       index = (value << 1 | (points + bank) & 1) << 1 | self.root_first
+       score = cache.scores[index]
+       if score is None:
+           cache.misses += 1
+           score = cache.scores[index] = self.evaluate(value, points, bank)
+       else:
+           cache.hits += 1
+           self.stats.eval_hits += 1
+       return score
+
+
+   def evaluate(self, value, points, bank):
+       """Score a position for the maximizer from its simulated points and bank"""
+       # The first player wins on an even final score, so the maximizer wants even when it began
+       winning = (final_score(points, bank) % 2 == 0) == self.root_first
+
+
+       # Terminal states, scored exactly as end_game would
+       if value >= TARGET:
+           return float('inf') if winning else float('-inf')
+
+
+       # Primary factors
+       parity = 2 if winning else -2  # Who would win if the game ended here
+       bank_bonus = 1.5 if value % 5 == 0 else 0  # Higher bank bonus
+
+
+       # Strategic factors
+       danger = value / TARGET  # Linear danger increase
+       options = sum(1 for m in MOVES if value * m < TARGET)  # Safe moves remaining
+
+
+       # Composite evaluation
+       return (parity + bank_bonus - danger * 10 + options * 0.5)
+
+
+   def evaluate_batch(self, values, points, bank):
+       """evaluate() over NumPy arrays of positions, with the same float results"""
+       # final_score only flips sign when points are odd, so its parity is that of points + bank
+       winning = ((points + bank) % 2 == 0) == self.root_first
+       parity = np.where(winning, 2.0, -2.0)
+       bank_bonus = np.where(values % 5 == 0, 1.5, 0.0)
+       danger = values / TARGET
+       options = sum((values * m < TARGET).astype(np.int64) for m in MOVES)
+       scores = parity + bank_bonus - danger * 10 + options * 0.5
+
+
+       terminal = values >= TARGET
+       scores[terminal & winning] = float('inf')
+       scores[terminal & ~winning] = float('-inf')
+       return scores
+
+
+   def batch_choose_move(self, state, depth):
+       """Full-width minimax: expand each level as one array, evaluate it, back the scores up"""
+       start_time = time.time()
+       self.root_first = state.player == state.first_player
+       self.nodes_visited = 0
+       multipliers = np.array(MOVES, dtype=np.int64)
+
+
+       # Each level holds the children of the previous level's unfinished games, three per parent,
+       # as (values, points, bank) arrays updated the way apply_move does
+       levels = [(np.array([state.value], dtype=np.int64),
+                  np.array([state.points], dtype=np.int64),
+                  np.array([state.bank], dtype=np.int64))]
+       started = time.perf_counter()
+       for _ in range(depth):
+           values, points, bank = levels[-1]
+           live = values < TARGET
+           children = (values[live][:, None] * multipliers).ravel()
+           if not children.size:
+               break
+           self.nodes_visited += children.size
+           self.stats.expanded += int(live.sum())
+           self.stats.generated += children.size
+           levels.append((
+               children,
+               np.repeat(points[live], len(MOVES)) + np.where(children % 2 == 0, 1, -1),
+               np.repeat(bank[live], len(MOVES)) + (children % 5 == 0)
+           ))
+       self.stats.build_time += time.perf_counter() - started
+
+
+       started = time.perf_counter()
+       scores = self.evaluate_batch(*levels[-1])
+       self.stats.evaluated += scores.size
+       for level in range(len(levels) - 2, 0, -1):
+           grouped = scores.reshape(-1, len(MOVES))
+           backed = grouped.max(axis=1) if level % 2 == 0 else grouped.min(axis=1)
+           scores = self.evaluate_batch(*levels[level])  # Kept for finished games
+           self.stats.evaluated += scores.size
+           scores[levels[level][0] < TARGET] = backed
+       self.stats.eval_time += time.perf_counter() - started
+
+
+       best = int(np.argmax(scores))  # First of equal scores, like the tree search
+       best_move = MOVES[best]
+       return SearchResult(
+           best_move,
+           state.value * best_move,
+           float(scores[best]),
+           self.nodes_visited,
+           time.time() - start_time,
+           None,
+           depth
+       )
+
+
+   def minimax(self, node, depth, maximizing):
+       if depth == 0 or node.is_terminal():
+           node.score = self.evaluate_state(node)
+           return node.score
+
+
+       cached = self.probe_node(node, depth, float('-inf'), float('inf'), maximizing)
+       if cached is not None:
+           return cached
+       if not node.children:
+           self.expand(node)
+
+
+       if maximizing:
+           max_eval = float('-inf')
+           for child in node.children:
+               eval = self.minimax(child, depth - 1, False)
+               max_eval = max(max_eval, eval) if eval is not None else max_eval
+           node.score = max_eval
+       else:
+           min_eval = float('inf')
+           for child in node.children:
+               eval = self.minimax(child, depth - 1, True)
+               min_eval = min(min_eval, eval) if eval is not None else min_eval
+           node.score = min_eval
+
+
+       if self.table is not None:
+           self.table.store(self.state_key(node.value, node.points, node.bank, depth, maximizing),
+                            node.score, EXACT, self.best_child_move(node, maximizing))
+       return node.score
+
+
+   def alpha_beta(self, node, depth, alpha, beta, maximizing):
+       if depth == 0 or node.is_terminal():
+           node.score = self.evaluate_state(node)
+           return node.score
+
+
+       cached = self.probe_node(node, depth, alpha, beta, maximizing)
+       if cached is not None:
+           return cached
+       if not node.children:
+           self.expand(node)
+       alpha_orig, beta_orig = alpha, beta
+       # Below the root, scores kept from the previous move's search order the children
+       children = node.children if node.parent is None else \
+           self.previous_order(node.children, maximizing)
+
+
+       if maximizing:
+           value = float('-inf')
+           for i, child in enumerate(children):
+               child_value = self.alpha_beta(child, depth - 1, alpha, beta, False)
+               if child_value is not None:
+                   value = max(value, child_value)
+                   alpha = max(alpha, value)
+                   if alpha >= beta:
+                       self.pruned += len(node.children) - i - 1
+                       self.stats.cutoffs[depth] = self.stats.cutoffs.get(depth, 0) + 1
+                       break
+           node.score = value
+       else:
+           value = float('inf')
+           for i, child in enumerate(children):
+               child_value = self.alpha_beta(child, depth - 1, alpha, beta, True)
+               if child_value is not None:
+                   value = min(value, child_value)
+                   beta = min(beta, value)
+                   if alpha >= beta:
+                       self.pruned += len(node.children) - i - 1
+                       self.stats.cutoffs[depth] = self.stats.cutoffs.get(depth, 0) + 1
+                       break
+           node.score = value
+
+
+       if self.table is not None:
+           self.table.store(self.state_key(node.value, node.points, node.bank, depth, maximizing),
+                            value, self.bound_flag(value, alpha_orig, beta_orig),
+                            self.best_child_move(node, maximizing))
+       return value
+
+
+   def lazy_minimax(self, key, depth):
+       """Minimax over positions generated on demand, without GameTreeNode objects; a position
+       is its packed key, which also says whether the maximizer is to move
+       """
+       trace = self.trace
+       if trace is not None:
+           trace.enter(*unpack(key)[:3])
+       if depth == 0 or key >> VALUE_SHIFT >= TARGET:
+           score = self.key_score(key)
+           return score if trace is None else trace.leave(score)
+
+
+       maximizing = key & MAXIMIZING_BIT != 0
+       position = key & PARITY_MASK
+       table_key = None
+       if self.table is not None:
+           table_key = position | depth << DEPTH_SHIFT
+           cached, _ = self.probe(table_key, float('-inf'), float('inf'))
+           if cached is not None:
+               return cached if trace is None else trace.leave(cached, note="from the table")
+
+
+       best_score = float('-inf') if maximizing else float('inf')
+       best_move = None
+       moves = self.promote(MOVES, self.hint(position))
+       for move, child in self.successors(key, moves):
+           score = self.lazy_minimax(child, depth - 1)
+           better = score > best_score if maximizing else score < best_score
+           if better or best_move is None:
+               best_score, best_move = score, move
+
+
+       self.remember(position, best_move)
+       if table_key is not None:
+           self.table.store(table_key, best_score, EXACT, best_move)
+       return best_score if trace is None else trace.leave(best_score, best_move)
+
+
+   def lazy_alpha_beta(self, key, depth, alpha, beta):
+       """Alpha-beta that stops generating children as soon as a branch is cut off"""
+       trace = self.trace
+       if trace is not None:
+           trace.enter(*unpack(key)[:3])
+       if depth == 0 or key >> VALUE_SHIFT >= TARGET:
+           score = self.key_score(key)
+           return score if trace is None else trace.leave(score)
+
+
+       maximizing = key & MAXIMIZING_BIT != 0
+       position = key & PARITY_MASK
+       table_key = None
+       table_move = None
+       if self.table is not None:
+           table_key = position | depth << DEPTH_SHIFT
+           cached, table_move = self.probe(table_key, alpha, beta)
+           if cached is not None:
+               return cached if trace is None else trace.leave(cached, note="from the table")
+       alpha_orig, beta_orig = alpha, beta
+
+
+       best_score = float('-inf') if maximizing else float('inf')
+       best_move = None
+       moves = self.order_moves(key, depth, maximizing, table_move, self.hint(position))
+       for i, (move, child) in enumerate(self.successors(key, moves)):
+           score = self.lazy_alpha_beta(child, depth - 1, alpha, beta)
+           if maximizing:
+               if score > best_score or best_move is None:
+                   best_score, best_move = score, move
+               alpha = max(alpha, best_score)
+           else:
+               if score < best_score or best_move is None:
+                   best_score, best_move = score, move
+               beta = min(beta, best_score)
+           if alpha >= beta:
+               self.record_cutoff(depth, maximizing, move, len(moves) - i - 1)
+               if trace is not None:
+                   trace.prune(moves[i + 1:])
+               break  # The remaining children are never generated
+
+
+       self.remember(position, best_move)
+       if table_key is not None:
+           self.table.store(table_key, best_score,
+                            self.bound_flag(best_score, alpha_orig, beta_orig), best_move)
+       return best_score if trace is None else trace.leave(best_score, best_move)
+
+
+   def null_window_search(self, key, depth, bound):
+       """PVS probe of a child: only tells whether its score beats bound for the parent"""
+       # Scores are floats, so the narrowest window is one representable step wide
+       if key & MAXIMIZING_BIT:  # The parent minimizes
+           return self.lazy_pvs(key, depth, math.nextafter(bound, float('-inf')), bound)
+       return self.lazy_pvs(key, depth, bound, math.nextafter(bound, float('inf')))
+
+
+   def lazy_pvs(self, key, depth, alpha, beta):
+       """Principal variation search: the first child gets the full window, the others a null
+       window that only proves them worse, and a full re-search when it does not
+       """
+       trace = self.trace
+       if trace is not None:
+           trace.enter(*unpack(key)[:3])
+       if depth == 0 or key >> VALUE_SHIFT >= TARGET:
+           score = self.key_score(key)
+           return score if trace is None else trace.leave(score)
+
+
+       maximizing = key & MAXIMIZING_BIT != 0
+       position = key & PARITY_MASK
+       table_key = None
+       table_move = None
+       if self.table is not None:
+           table_key = position | depth << DEPTH_SHIFT
+           cached, table_move = self.probe(table_key, alpha, beta)
+           if cached is not None:
+               return cached if trace is None else trace.leave(cached, note="from the table")
+       alpha_orig, beta_orig = alpha, beta
+
+
+       best_score = float('-inf') if maximizing else float('inf')
+       best_move = None
+       moves = self.order_moves(key, depth, maximizing, table_move, self.hint(position))
+       for i, (move, child) in enumerate(self.successors(key, moves)):
+           if best_move is None:
+               score = self.lazy_pvs(child, depth - 1, alpha, beta)
+           else:
+               score = self.null_window_search(child, depth - 1, alpha if maximizing else beta)
+               if alpha < score < beta:  # Better than the principal variation after all
+                   score = self.lazy_pvs(child, depth - 1, alpha, beta)
+           if maximizing:
+               if score > best_score or best_move is None:
+                   best_score, best_move = score, move
+               alpha = max(alpha, best_score)
+           else:
+               if score < best_score or best_move is None:
+                   best_score, best_move = score, move
+               beta = min(beta, best_score)
+           if alpha >= beta:
+               self.record_cutoff(depth, maximizing, move, len(moves) - i - 1)
+               if trace is not None:
+                   trace.prune(moves[i + 1:])
+               break
+
+
+       self.remember(position, best_move)
+       if table_key is not None:
+           self.table.store(table_key, best_score,
+                            self.bound_flag(best_score, alpha_orig, beta_orig), best_move)
+       return best_score if trace is None else trace.leave(best_score, best_move)
+
+
+   def ply_buffers(self, depth):
+       """Per-ply lists for stack_search, reallocated only when a deeper search needs them"""
+       if self.plies is None or len(self.plies[0]) <= depth:
+           size = max(depth, MAX_DEPTH) + 1
+           # alpha, beta, best score, best move, move order, next move index
+           self.plies = tuple([None] * size for _ in range(6))
+       return self.plies
+
+
+   def stack_search(self, key, depth, alpha, beta, prune=True):
+       """lazy_alpha_beta (or lazy_minimax, without prune) on an explicit stack of plies.
+
+       Children are generated, counted and scored in the same order as the recursive searches,
+       so results and node counts are identical; only the Python frame per ply is gone. One
+       packed key walks the tree, made on the way down and unmade on the way back up.
+       """
+       if depth == 0 or key >> VALUE_SHIFT >= TARGET:
+           return self.key_score(key)
+
+
+       alphas, betas, bests, best_moves, orders, nexts = self.ply_buffers(depth)
+       stats = self.stats
+       timed = self.timed
+       hinted = self.move_hints is not None  # Only iterative deepening keeps hints
+       count = len(MOVES)
+       inf = float('inf')
+       maximizing = key & MAXIMIZING_BIT != 0
+
+
+       # Ply 0 is the position searched; odd plies belong to the other side
+       ply = 0
+       alphas[0], betas[0] = alpha, beta
+       bests[0], best_moves[0], nexts[0] = -inf if maximizing else inf, None, 0
+       orders[0] = self.promote(MOVES, self.hint(key & PARITY_MASK)) if hinted else MOVES
+       stats.expanded += 1
+       while True:
+           node_max = maximizing if ply % 2 == 0 else not maximizing
+           if nexts[ply] < count:
+               move = orders[ply][nexts[ply]]
+               nexts[ply] += 1
+               started = time.perf_counter() if timed else None
+               child = make(key, move)
+               if started is not None:
+                   stats.build_time += time.perf_counter() - started
+               stats.generated += 1
+               self.nodes_visited += 1  # Track nodes visited
+               if self.nodes_visited % CLOCK_CHECK == 0:
+                   self.check_clock()
+
+
+               if depth - ply == 1 or child >> VALUE_SHIFT >= TARGET:
+                   score = self.key_score(child)
+               else:
+                   # Descend: the child becomes the next ply with the parent's window
+                   ply += 1
+                   key = child
+                   alphas[ply], betas[ply] = alphas[ply - 1], betas[ply - 1]
+                   bests[ply], best_moves[ply], nexts[ply] = inf if node_max else -inf, None, 0
+                   orders[ply] = self.promote(MOVES, self.hint(key & PARITY_MASK)) if hinted \
+                       else MOVES
+                   stats.expanded += 1
+                   continue
+           else:
+               # Every child of this ply is done; back its score up to the parent
+               if hinted:
+                   self.remember(key & PARITY_MASK, best_moves[ply])
+               score = bests[ply]
+               if ply == 0:
+                   return score
+               ply -= 1
+               node_max = not node_max
+               move = orders[ply][nexts[ply] - 1]
+               key = unmake(key, move)
+
+
+           # Fold the child's score into the ply that generated it
+           if node_max:
+               if score > bests[ply] or best_moves[ply] is None:
+                   bests[ply], best_moves[ply] = score, move
+                   if score > alphas[ply]:
+                       alphas[ply] = score
+           else:
+               if score < bests[ply] or best_moves[ply] is None:
+                   bests[ply], best_moves[ply] = score, move
+                   if score < betas[ply]:
+                       betas[ply] = score
+           if prune and alphas[ply] >= betas[ply]:
+               self.record_cutoff(depth - ply, node_max, move, count - nexts[ply])
+               nexts[ply] = count  # The remaining children are never generated
+
+
+   def solve_move(self, state):
+       """Look up the perfect-play move in the precomputed solution"""
+       start_time = time.time()
+       move, wins, plies = get_solver().best_move(state.value, state.points, state.bank,
+                                              state.player == state.first_player)
+       self.nodes_visited = 0
+       return SearchResult(
+           move,
+           state.value * move,
+           float('inf') if wins else float('-inf'),
+           0,
+           time.time() - start_time,
+           None,
+           plies
+       )
+
+
+   def supports(self, algorithm):
+       """Whether this engine's configuration can run `algorithm`"""
+       if algorithm == PERFECT:
+           return True
+       if self.batch:
+           return algorithm == MINIMAX
+       return not ((self.stack or not self.lazy) and algorithm == PVS)
+
+
+   def check_algorithm(self, algorithm):
+       if not self.supports(algorithm):
+           if self.batch:
+               raise ValueError("The batch search only runs minimax")
+           if not self.lazy:
+               raise ValueError("The tree search runs minimax and alpha-beta, not PVS")
+           raise ValueError("The explicit-stack search runs minimax and alpha-beta, not PVS")
+
+
+   def choose_move(self, state, depth, algorithm):
+       """Search the position for the side to move and return a SearchResult"""
+       self.check_algorithm(algorithm)
+       self.last_trace = None
+       self.nodes_before = 0
+       with self.instrument() as stats:
+           if algorithm == PERFECT:
+               result = self.solve_move(state)
+           elif self.batch:
+               result = self.batch_choose_move(state, depth)
+           elif self.lazy:
+               result = self.lazy_choose_move(state, depth, algorithm)
+           else:
+               result = self.tree_choose_move(state, depth, algorithm)
+       result.stats = stats
+       return result
+
+
+   def lazy_choose_move(self, state, depth, algorithm, first_move=None):
+       """Search without materialising the game tree"""
+       if algorithm == PVS:
+           return self.pvs_choose_move(state, depth, first_move)
+       start_time = time.time()
+       self.nodes_visited = 0
+       self.pruned = 0
+       self.killers = {}
+       self.root_first = state.player == state.first_player
+       self.trace = SearchTrace(state) if self.tracing else None
+
+
+       best_move = None
+       best_score = float('-inf')
+       alpha = float('-inf')
+       moves = self.promote(MOVES, first_move)
+       for move, child in self.successors(self.root_key(state), moves):
+           if self.stack:
+               score = self.stack_search(child, depth - 1, alpha, float('inf'),
+                                         algorithm != MINIMAX)
+               if algorithm != MINIMAX:
+                   alpha = max(alpha, score)
+           elif algorithm == MINIMAX:
+               score = self.lazy_minimax(child, depth - 1)
+           else:
+               score = self.lazy_alpha_beta(child, depth - 1, alpha, float('inf'))
+               alpha = max(alpha, score)
+           if score > best_score or best_move is None:
+               best_score = score
+               best_move = move
+       self.finish_trace(best_score, best_move)
+
+
+       return SearchResult(
+           best_move,
+           state.value * best_move,
+           best_score,
+           self.nodes_visited,
+           time.time() - start_time,
+           None,
+           depth,
+           self.pruned_fraction(self.pruned, self.nodes_visited)
+       )
+
+
+   def finish_trace(self, best_score, best_move):
+       """Close the root of a completed search's trace and keep it as last_trace"""
+       if self.trace is not None:
+           self.trace.leave(best_score, best_move)
+           self.last_trace = self.trace
+           self.trace = None
+
+
+   def pvs_root(self, state, depth, alpha, beta, first_move=None):
+       """Return (best move, score) of a PVS search of the root within (alpha, beta)"""
+       best_move = None
+       best_score = float('-inf')
+       moves = self.promote(MOVES, first_move)
+       for move, child in self.successors(self.root_key(state), moves):
+           if best_move is None:
+               score = self.lazy_pvs(child, depth - 1, alpha, beta)
+           else:
+               score = self.null_window_search(child, depth - 1, alpha)
+               if alpha < score < beta:
+                   score = self.lazy_pvs(child, depth - 1, alpha, beta)
+           if score > best_score or best_move is None:
+               best_score = score
+               best_move = move
+           alpha = max(alpha, score)
+           if alpha >= beta:
+               if self.trace is not None:
+                   self.trace.prune(moves[moves.index(move) + 1:])
+               break
+       return best_move, best_score
+
+
+   def pvs_choose_move(self, state, depth, first_move=None):
+       """PVS inside an aspiration window around the previous score, widened if it fails"""
+       start_time = time.time()
+       self.nodes_visited = 0
+       self.pruned = 0
+       self.killers = {}
+       self.root_first = state.player == state.first_player
+       self.trace = SearchTrace(state) if self.tracing else None
+
+
+       aspirated = False
+       alpha, beta = float('-inf'), float('inf')
+       if self.aspiration is not None:
+           root_first, previous = self.aspiration
+           if root_first == self.root_first and math.isfinite(previous):
+               aspirated = True
+               alpha, beta = previous - ASPIRATION_WINDOW, previous + ASPIRATION_WINDOW
+       best_move, best_score = self.pvs_root(state, depth, alpha, beta, first_move)
+       if aspirated and not alpha < best_score < beta:
+           # A score on or outside the window is only a bound, search again with a full one
+           best_move, best_score = self.pvs_root(state, depth, float('-inf'), float('inf'),
+                                                 first_move)
+       self.aspiration = (self.root_first, best_score)
+       self.finish_trace(best_score, best_move)
+
+
+       return SearchResult(
+           best_move,
+           state.value * best_move,
+           best_score,
+           self.nodes_visited,
+           time.time() - start_time,
+           None,
+           depth,
+           self.pruned_fraction(self.pruned, self.nodes_visited)
+       )
+
+
+   def iterative_deepening(self, state, algorithm, budget_ms, max_depth=MAX_DEPTH):
+       """Search depth 1, 2, 3 ... until budget_ms runs out; return the deepest completed result"""
+       self.check_algorithm(algorithm)
+       if (self.batch or not self.lazy) and algorithm != PERFECT:
+           raise ValueError("Iterative deepening runs the lazy search, not the tree or batch one")
+       self.last_trace = None
+       if algorithm == PERFECT:
+           return self.choose_move(state, 1, algorithm)
+
+
+       start_time = time.time()
+       total_nodes = 0
+       total_pruned = 0
+       result = None
+       self.nodes_before = 0
+       self.move_hints = {}
+       try:
+           with self.instrument() as stats:
+               for depth in range(1, max_depth + 1):
+                   # Depth 1 always completes so that there is a move to play
+                   self.deadline = start_time + budget_ms / 1000 if depth > 1 else None
+                   try:
+                       iteration = self.lazy_choose_move(state, depth, algorithm,
+                                                         result.move if result else None)
+                   except SearchTimeout:
+                       total_nodes += self.nodes_visited
+                       total_pruned += self.pruned
+                       break
+
+
+                   result = iteration
+                   total_nodes += self.nodes_visited
+                   total_pruned += self.pruned
+                   self.nodes_before = total_nodes
+                   if depth >= max_plies(state.value):
+                       break  # Every line already reaches the end of the game
+       finally:
+           self.deadline = None
+           self.move_hints = None
+           self.nodes_before = 0
+           self.trace = None  # Left half built by an iteration that ran out of time
+
+
+       self.nodes_visited = total_nodes
+       result.nodes_visited = total_nodes
+       result.pruned_fraction = self.pruned_fraction(total_pruned, total_nodes)
+       result.computation_time = time.time() - start_time
+       result.stats = stats
+       return result
+
+
+   def tree_choose_move(self, state, depth, algorithm):
+       """Build the GameTreeNode tree, or extend the one kept from the last move, then search it"""
+       start_time = time.time()
+       self.nodes_visited = 0
+       self.pruned = 0
+       self.root_first = state.player == state.first_player
+
+
+       # Continue the previous move's tree when it reached this position
+       root_node = self.reroot(state)
+       self.tree = (self.root_first, root_node)
+       kept = self.tree_size(root_node) - 1
+       self.stats.reused = kept
+
+
+       # Generate game tree up front unless the table expands it on demand; a kept tree
+       # only grows at its frontier
+       if self.table is None:
+           self.generate_game_tree(root_node, depth)
+
+
+       # Run algorithm
+       if algorithm == MINIMAX:
+           self.minimax(root_node, depth, True)
+       else:
+           self.alpha_beta(root_node, depth, float('-inf'), float('inf'), True)
+
+
+       # Find best move - handle None scores
+       best_move = None
+       best_score = float('-inf')
+       for child in root_node.children:
+           # Only consider children with calculated scores
+           if child.score is not None:
+               if child.score > best_score or best_move is None:
+                   best_score = child.score
+                   best_move = child.value
+
+
+       # If no valid move found (shouldn't happen), pick first child
+       if best_move is None and root_node.children:
+           best_move = root_node.children[0].value
+           best_score = root_node.children[0].score if root_node.children[0].score is not None else 0
+
+
+       return SearchResult(
+           best_move // state.value if best_move is not None else None,
+           best_move,
+           best_score,
+           self.nodes_visited,
+           time.time() - start_time,
+           root_node,
+           depth,
+           # Pruned nodes were built, by this search or an earlier one
+           self.pruned / (kept + self.nodes_visited) if kept + self.nodes_visited else 0.0
+       )
+
+
+
+
+def choose_move(state, depth, algorithm, table=None):
+   """Pick a move for the side to move in `state` using a fresh engine"""
+   return SearchEngine(table).choose_move(state, depth, algorithm)
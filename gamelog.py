@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import sys
+import uuid
+
+
+from rules import advance
+
+
+
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'games.jsonl')
+
+BATCH_SIZE = 32  # Records buffered before they are appended to the file
+
+
+
+
+class GameLog:
+   """Append-only log of played games, one compact JSON record per line.
+
+   A game is a 'start' record, one 'move' record per move (search stats included) and an 'end'
+   record, all tagged with the game's id. Records are buffered and appended in batches, and
+   every batch is flushed when a game ends.
+   """
+
+   def __init__(self, path=LOG_PATH, batch_size=BATCH_SIZE):
+       self.path = path
+       self.batch_size = batch_size
+       self.pending = []  # Encoded records not written yet
+       self.game = None  # Id of the game being logged
+
+
+   def __enter__(self):
+       return self
+
+
+   def __exit__(self, *exc):
+       self.close()
+
+
+   def append(self, record):
+       self.pending.append(json.dumps(record, separators=(',', ':')))
+       if len(self.pending) >= self.batch_size:
+           self.flush()
+
+
+   def flush(self):
+       if not self.pending:
+           return
+       data = '\n'.join(self.pending) + '\n'
+       with open(self.path, 'ab+') as f:
+           # A crash can leave the last line cut short; the batch must not continue it
+           f.seek(0, os.SEEK_END)
+           if f.tell():
+               f.seek(-1, os.SEEK_END)
+               if f.read(1) != b'\n':
+                   data = '\n' + data
+           f.write(data.encode())
+       self.pending = []
+
+
+   def start_game(self, start, first_player, algorithm, depth, time_budget=0):
+       self.game = uuid.uuid4().hex[:12]
+       self.append({'type': 'start', 'game': self.game, 'start': start,
+                    'first_player': first_player, 'algorithm': algorithm, 'depth': depth,
+                    'time_budget': time_budget})
+
+
+   def record_move(self, move):
+       """Log one move_history entry of the current game"""
+       if self.game is not None:
+           self.append({'type': 'move', 'game': self.game, **move})
+
+
+   def end_game(self, final_score=None, winner=None):
+       """Close the current game; without a winner it was abandoned"""
+       if self.game is None:
+           return
+       self.append({'type': 'end', 'game': self.game, 'final_score': final_score,
+                    'winner': winner})
+       self.game = None
+       self.flush()
+
+
+   def close(self):
+       self.flush()
+
+
+
+
+def read_games(path=LOG_PATH):
+   """Yield the logged games one at a time, as start records with 'moves' and 'result' added.
+
+   The file is streamed line by line, so only games still open at the current line are held in
+   memory. Games that never ended are yielded at the end with a None result.
+   """
+   if not os.path.exists(path):
+       return
+   open_games = {}
+   with open(path) as f:
+       for line in f:
+           try:
+               record = json.loads(line)
+           except ValueError:  # A line cut short by a crash
+               continue
+           kind = record.pop('type', None)
+           game_id = record.get('game')
+           if kind == 'start':
+               open_games[game_id] = {**record, 'moves': [], 'result': None}
+           elif game_id not in open_games:
+               continue  # Its start record was lost
+           elif kind == 'move':
+               del record['game']
+               open_games[game_id]['moves'].append(record)
+           elif kind == 'end':
+               game = open_games.pop(game_id)
+               game['result'] = {'final_score': record.get('final_score'),
+                                 'winner': record.get('winner')}
+               yield game
+   yield from open_games.values()
+
+
+def replay(game):
+   """Yield (value, points, bank, move record) before each move of a logged game"""
+   value, points, bank = game['start'], 0, 0
+   for move in game['moves']:
+       yield value, points, bank, move
+       value *= move['move']
+       points, bank = advance(points, bank, value)
+
+
+def main():
+   parser = argparse.ArgumentParser(description="Summarise the games in a game log")
+   parser.add_argument('path', nargs='?', default=LOG_PATH)
+   args = parser.parse_args()
+
+
+   games = finished = moves = nodes = 0
+   wins = {}
+   for game in read_games(args.path):
+       games += 1
+       for value, points, bank, move in replay(game):
+           moves += 1
+           nodes += move.get('nodes_visited', 0)
+       if game['result'] is not None and game['result']['winner'] is not None:
+           finished += 1
+           wins[game['result']['winner']] = wins.get(game['result']['winner'], 0) + 1
+   print(f"{games} games ({finished} finished), {moves} moves, {nodes} nodes searched",
+         file=sys.stderr)
+   for side, count in sorted(wins.items()):
+       print(f"{side}: {count} wins", file=sys.stderr)
+
+
+
+
+if __name__ == "__main__":
+   main()
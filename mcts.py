@@ -0,0 +1,253 @@
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+
+
+from engine import SearchResult, SearchStats, SearchCancelled, MCTS
+from rules import TARGET, MOVES, advance, final_score
+
+
+
+
+PLAYOUTS = 5000  # Playouts per move when no time budget is given
+EXPLORATION = math.sqrt(2)  # UCT exploration constant
+CANCEL_CHECK = 64  # Playouts between cancellation and deadline checks
+
+
+
+
+class MCTSNode:
+   __slots__ = ('value', 'points', 'bank', 'mover_first', 'move', 'parent', 'children', 'untried',
+                'visits', 'wins')
+
+   def __init__(self, value, points, bank, mover_first, move=None, parent=None):
+       self.value = value  # The current number in the game
+       self.points = points  # Total points after the move
+       self.bank = bank  # Game bank after the move
+       self.mover_first = mover_first  # Whether the side to move here started the game
+       self.move = move  # The move (3, 4, or 5) that led to this node
+       self.parent = parent
+       self.children = []
+       self.untried = list(MOVES) if value < TARGET else []  # Moves without a child yet
+       self.visits = 0
+       self.wins = 0  # Playouts won by the side that made `move`
+
+
+   def uct_child(self, exploration):
+       """Child with the highest upper confidence bound"""
+       log_visits = math.log(self.visits)
+       return max(self.children, key=lambda child: child.wins / child.visits
+                  + exploration * math.sqrt(log_visits / child.visits))
+
+
+
+
+def playout(value, points, bank, rng):
+   """Play random moves to the end of the game; return (first player won, moves played)"""
+   plies = 0
+   while value < TARGET:
+       value *= rng.choice(MOVES)
+       points, bank = advance(points, bank, value)
+       plies += 1
+   # Scored exactly as end_game does: the first player wins on an even final score
+   return final_score(points, bank) % 2 == 0, plies
+
+
+def run_playouts(root, playouts, deadline, rng, exploration, stats, cancelled=None):
+   """Grow the tree under root by up to `playouts` select/expand/playout/backup iterations"""
+   depth = 0
+   for i in range(playouts):
+       if i % CANCEL_CHECK == 0 and i:
+           if cancelled is not None and cancelled.is_set():
+               raise SearchCancelled()
+           if deadline is not None and time.time() > deadline:
+               break
+
+
+       # Selection
+       node = root
+       level = 0
+       while not node.untried and node.children:
+           node = node.uct_child(exploration)
+           level += 1
+
+
+       # Expansion
+       if node.untried:
+           move = node.untried.pop(rng.randrange(len(node.untried)))
+           value = node.value * move
+           points, bank = advance(node.points, node.bank, value)
+           child = MCTSNode(value, points, bank, not node.mover_first, move, node)
+           node.children.append(child)
+           node = child
+           level += 1
+           stats.expanded += 1
+           stats.generated += 1
+       depth = max(depth, level)
+
+
+       # Simulation
+       first_wins, plies = playout(node.value, node.points, node.bank, rng)
+       stats.generated += plies
+       stats.evaluated += 1
+
+
+       # Backpropagation
+       while node is not None:
+           node.visits += 1
+           if first_wins != node.mover_first:  # The side that moved into node won
+               node.wins += 1
+           node = node.parent
+   return depth
+
+
+def _worker_playouts(value, points, bank, mover_first, playouts, deadline, exploration, seed):
+   """Search an independent tree in a worker; return its root's (move, visits, wins) and stats"""
+   root = MCTSNode(value, points, bank, mover_first)
+   stats = SearchStats()
+   run_playouts(root, playouts, deadline, random.Random(seed), exploration, stats)
+   return [(child.move, child.visits, child.wins) for child in root.children], stats
+
+
+
+
+class MonteCarloSearch:
+   """UCT search with random playouts to the end of the game.
+
+   The tree is kept between moves: the next search starts from the node of the new position if
+   the previous tree reached it. With workers, extra trees are grown from the root in a process
+   pool and their root statistics are added up before the move is picked (root parallelism).
+   """
+
+   def __init__(self, playouts=PLAYOUTS, workers=0, exploration=EXPLORATION, seed=None):
+       self.playouts = playouts  # Playouts per move, shared out between the processes
+       self.workers = os.cpu_count() if workers is None else workers  # Extra processes, 0 for none
+       self.exploration = exploration
+       self.rng = random.Random(seed)
+       self.root = None  # Tree of the latest search, re-rooted by the next one
+       self.pool = None
+       self.cancelled = threading.Event()  # Set from another thread to abort searches
+       self.stats = SearchStats()
+
+
+   def __enter__(self):
+       return self
+
+
+   def __exit__(self, *exc):
+       self.close()
+
+
+   def start_pool(self):
+       """Start the worker processes now instead of in the first search, e.g. from the thread
+       that owns the application rather than a search thread
+       """
+       if self.workers > 0 and self.pool is None:
+           self.pool = ProcessPoolExecutor(self.workers)
+           # The executor only launches processes as jobs arrive, so give each one a job
+           for future in [self.pool.submit(int) for _ in range(self.workers)]:
+               future.result()
+
+
+   def close(self):
+       if self.pool is not None:
+           self.pool.shutdown(wait=False, cancel_futures=True)
+           self.pool = None
+
+
+   def cancel(self):
+       """Abort the running search, and any later one until resume() is called; thread-safe"""
+       self.cancelled.set()
+
+
+   def resume(self):
+       self.cancelled.clear()
+
+
+   def progress(self):
+       """Positions generated so far by the running search; safe to read from another thread"""
+       return self.stats.generated
+
+
+   def find_root(self, state, mover_first):
+       """The node for state in the previous tree, at most two plies below its root"""
+       frontier = [self.root] if self.root is not None else []
+       for _ in range(3):
+           for node in frontier:
+               if (node.value, node.points, node.bank, node.mover_first) == \
+                       (state.value, state.points, state.bank, mover_first):
+                   node.parent = None  # The rest of the old tree can be freed
+                   return node
+           frontier = [child for node in frontier for child in node.children]
+       return MCTSNode(state.value, state.points, state.bank, mover_first)
+
+
+   def choose_move(self, state, depth=None, algorithm=MCTS):
+       """Same contract as SearchEngine.choose_move; the depth is not used"""
+       return self.search(state, self.playouts, None)
+
+
+   def iterative_deepening(self, state, algorithm, budget_ms, max_depth=None):
+       """Play out until budget_ms runs out, like SearchEngine.iterative_deepening"""
+       return self.search(state, None, time.time() + budget_ms / 1000)
+
+
+   def search(self, state, playouts, deadline):
+       start_time = time.time()
+       self.stats = SearchStats()
+       root = self.find_root(state, state.player == state.first_player)
+       self.root = root
+       self.stats.reused = root.visits
+       if playouts is None:
+           playouts = 1 << 62  # Only the deadline ends the search
+
+
+       jobs = []
+       share = playouts
+       if self.workers > 0:
+           self.start_pool()
+           share = playouts // (self.workers + 1)
+           for _ in range(self.workers):
+               jobs.append(self.pool.submit(_worker_playouts, root.value, root.points, root.bank,
+                                            root.mover_first, share, deadline, self.exploration,
+                                            self.rng.getrandbits(64)))
+
+
+       depth = run_playouts(root, playouts - share * len(jobs), deadline, self.rng,
+                            self.exploration, self.stats, self.cancelled)
+
+
+       # Visits and wins per root move, over this process's tree and every worker's
+       totals = {child.move: [child.visits, child.wins] for child in root.children}
+       try:
+           for job in jobs:
+               if self.cancelled.is_set():
+                   raise SearchCancelled()
+               children, stats = job.result()
+               for move, visits, wins in children:
+                   total = totals.setdefault(move, [0, 0])
+                   total[0] += visits
+                   total[1] += wins
+               self.stats.generated += stats.generated
+               self.stats.expanded += stats.expanded
+               self.stats.evaluated += stats.evaluated
+       except CancelledError:
+           raise SearchCancelled()
+
+
+       # The most visited move is the most robust choice
+       best_move = max(totals, key=lambda move: totals[move][0])
+       visits, wins = totals[best_move]
+       return SearchResult(
+           best_move,
+           state.value * best_move,
+           wins / visits,
+           self.stats.generated,
+           time.time() - start_time,
+           None,
+           depth,
+           stats=self.stats
+       )
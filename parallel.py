@@ -0,0 +1,156 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+from encoding import VALUE_SHIFT, unpack
+from engine import SearchEngine, SearchResult, MINIMAX, PVS, PERFECT
+from rules import TARGET, MOVES
+
+
+
+
+_shared_alpha = None  # Best root score so far, shared by all worker processes
+
+
+
+
+def _init_worker(shared_alpha):
+   global _shared_alpha
+   _shared_alpha = shared_alpha
+
+
+def _search_split_point(key, depth, algorithm, root_first, ordering):
+   """Search the split point with packed key in a worker; return (score, alpha used, nodes)"""
+   engine = SearchEngine(ordering=ordering)
+   engine.root_first = root_first
+   if algorithm == MINIMAX:
+       return engine.lazy_minimax(key, depth), float('-inf'), engine.nodes_visited
+
+
+   alpha = _shared_alpha.value
+   search = engine.lazy_pvs if algorithm == PVS else engine.lazy_alpha_beta
+   score = search(key, depth, alpha, float('inf'))
+   return score, alpha, engine.nodes_visited
+
+
+
+
+class ParallelSearch:
+   """Root splitting: the positions split_depth plies below the root are searched in a
+   process pool, and each finished root move raises an alpha bound shared with the workers.
+   """
+
+   def __init__(self, workers=None, split_depth=2, ordering=()):
+       if split_depth < 1:
+           raise ValueError("split_depth must be at least 1")
+
+
+       self.split_depth = split_depth
+       self.ordering = tuple(ordering)
+       self.shared_alpha = multiprocessing.Value('d', float('-inf'))
+       self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(self.shared_alpha,))
+
+
+   def __enter__(self):
+       return self
+
+
+   def __exit__(self, *exc):
+       self.close()
+
+
+   def close(self):
+       self.pool.shutdown(cancel_futures=True)
+
+
+   def split_points(self, engine, key, depth, path=()):
+       """Yield (path, packed key, remaining depth) below the root; leaves are scored"""
+       if len(path) == self.split_depth or depth == 0 or key >> VALUE_SHIFT >= TARGET:
+           yield path, key, depth
+           return
+       for move, child in engine.successors(key):
+           yield from self.split_points(engine, child, depth - 1, path + (move,))
+
+
+   def back_up(self, scores, path):
+       """Minimax value of the node at path from the scores of its split points"""
+       if path in scores:
+           return scores[path]
+       children = [self.back_up(scores, path + (move,)) for move in MOVES]
+       return max(children) if len(path) % 2 == 0 else min(children)
+
+
+   def supports(self, algorithm):
+       return True  # Every split point runs on a plain recursive engine
+
+
+   def choose_move(self, state, depth, algorithm):
+       """Same contract as SearchEngine.choose_move, with the work spread over the pool"""
+       if algorithm == PERFECT:
+           return SearchEngine().choose_move(state, depth, algorithm)
+
+
+       start_time = time.time()
+       engine = SearchEngine()
+       engine.root_first = state.player == state.first_player
+       self.shared_alpha.value = float('-inf')
+
+
+       scores = {}  # Split point path -> score
+       pending = {}  # Future -> split point path
+       remaining = {move: 0 for move in MOVES}  # Unfinished split points per root move
+       alpha_used = {move: float('-inf') for move in MOVES}  # Highest alpha a job started with
+       for path, key, left in self.split_points(engine, engine.root_key(state), depth):
+           if left == 0 or key >> VALUE_SHIFT >= TARGET:
+               scores[path] = engine.evaluate(*unpack(key)[:3])
+               continue
+           future = self.pool.submit(_search_split_point, key, left, algorithm, engine.root_first,
+                                     self.ordering)
+           pending[future] = path
+           remaining[path[0]] += 1
+
+
+       nodes = engine.nodes_visited
+       if algorithm != MINIMAX:
+           for move in MOVES:
+               if remaining[move] == 0:  # Decided without any job, e.g. the game ends
+                   self.shared_alpha.value = max(self.shared_alpha.value,
+                                                 self.back_up(scores, (move,)))
+       while pending:
+           done, _ = wait(pending, return_when=FIRST_COMPLETED)
+           for future in done:
+               path = pending.pop(future)
+               score, alpha, job_nodes = future.result()
+               scores[path] = score
+               nodes += job_nodes
+               alpha_used[path[0]] = max(alpha_used[path[0]], alpha)
+               remaining[path[0]] -= 1
+               if remaining[path[0]] == 0 and algorithm != MINIMAX:
+                   # The root move is fully searched, later jobs can prune against it
+                   root_score = self.back_up(scores, (path[0],))
+                   if root_score > self.shared_alpha.value:
+                       self.shared_alpha.value = root_score
+
+
+       # A root score is exact when it beats every alpha its jobs were searched with;
+       # among equal scores prefer exact ones so a fail-low bound never wins a tie
+       best_move = None
+       best_rank = None
+       for move in MOVES:
+           score = self.back_up(scores, (move,))
+           rank = (score, score > alpha_used[move])
+           if best_rank is None or rank > best_rank:
+               best_move, best_rank = move, rank
+
+
+       return SearchResult(
+           best_move,
+           state.value * best_move,
+           best_rank[0],
+           nodes,
+           time.time() - start_time,
+           None,
+           depth
+       )
@@ -0,0 +1,34 @@
+TARGET = 3000  # The game ends once the number reaches this value
+MOVES = (3, 4, 5)  # Available multipliers
+
+HUMAN = "Human"
+COMPUTER = "Computer"
+
+
+
+
+def advance(points, bank, new_value):
+   """Points and bank after a move reaches new_value, as in UI.apply_move"""
+   return (points + (1 if new_value % 2 == 0 else -1),
+           bank + (1 if new_value % 10 in [0, 5] else 0))
+
+
+def max_plies(value):
+   """Length of the longest possible rest of the game, multiplying by 3 every move"""
+   plies = 0
+   while value < TARGET:
+       value *= 3
+       plies += 1
+   return plies
+
+
+def final_score(points, bank):
+   """Score once the game is over, as shown by UI.end_game"""
+   return points - bank if points % 2 == 0 else points + bank
+
+
+def winner(points, bank, first_player):
+   """The first player wins on an even final score, the other player on an odd one"""
+   if final_score(points, bank) % 2 == 0:
+       return first_player
+   return COMPUTER if first_player == HUMAN else HUMAN
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+from encoding import pack
+from engine import GameState, SearchEngine, MINIMAX, ALPHA_BETA, PVS, PERFECT, ORDERINGS
+from rules import TARGET, MOVES, HUMAN, COMPUTER, advance, max_plies, final_score, winner
+from transposition import TranspositionTable, EXACT
+
+
+
+
+ALGORITHMS = {
+   'minimax': MINIMAX,
+   'alphabeta': ALPHA_BETA,
+   'pvs': PVS,
+   'perfect': PERFECT
+}
+
+DEADLINE_MS = 2000  # Default time a computer move may take, queueing in the pool included
+DEADLINE_GRACE = 1.0  # Seconds a worker may overrun its deadline before the request fails
+SESSION_TTL = 1800  # Seconds of inactivity after which a session is dropped
+RESULT_CACHE_SIZE = 100000  # Finished searches kept for every session
+WORKER_TABLE_SIZE = 200000  # Transposition table entries in each worker process
+
+
+
+
+_table = None  # Transposition table of this worker process, shared by every session it serves
+
+
+
+
+def _init_worker(table_size):
+   global _table
+   _table = TranspositionTable(table_size)
+
+
+def _think(value, points, bank, mover_first, algorithm, depth, deadline):
+   """Search in a worker until depth or the deadline; return (move, score, depth, nodes)"""
+   engine = SearchEngine(_table, ordering=ORDERINGS)
+   state = GameState(value, points, bank, COMPUTER, COMPUTER if mover_first else HUMAN)
+   # Iterative deepening capped at the requested depth: the full search when there is time,
+   # the deepest completed one when the deadline comes first
+   budget_ms = max(0.0, (deadline - time.time()) * 1000)
+   result = engine.iterative_deepening(state, algorithm, budget_ms, max_depth=depth)
+   return result.move, result.score, result.depth, result.nodes_visited
+
+
+
+
+class RequestError(Exception):
+   """A request that cannot be served; the message is sent back to the client"""
+
+
+
+
+class GameSession:
+   """One game, played with the same rules as the Tk UI"""
+
+   def __init__(self, session_id, start, first_player, algorithm, depth):
+       self.id = session_id
+       self.value = start  # The current number in the game
+       self.points = 0  # Total points
+       self.bank = 0  # Game bank
+       self.first_player = first_player
+       self.player = first_player  # Side to move
+       self.algorithm = algorithm
+       self.depth = depth
+       self.move_history = []
+       self.lock = asyncio.Lock()  # Requests of a session are served one at a time
+       self.touched = time.monotonic()
+
+
+   @property
+   def over(self):
+       return self.value >= TARGET
+
+
+   def snapshot(self):
+       return self.value, self.points, self.bank, self.player, len(self.move_history)
+
+
+   def restore(self, snapshot):
+       """Undo the moves made since snapshot()"""
+       self.value, self.points, self.bank, self.player, moves = snapshot
+       del self.move_history[moves:]
+
+
+   def apply_move(self, move):
+       """UI.apply_move: multiply, update points and bank, hand the turn over"""
+       self.value *= move
+       self.points, self.bank = advance(self.points, self.bank, self.value)
+       if not self.over:
+           self.player = COMPUTER if self.player == HUMAN else HUMAN
+
+
+   def describe(self):
+       state = {
+           'session': self.id,
+           'number': self.value,
+           'points': self.points,
+           'bank': self.bank,
+           'to_move': None if self.over else self.player,
+           'over': self.over,
+           'history': self.move_history
+       }
+       if self.over:
+           # As UI.end_game reports it
+           state['final_score'] = final_score(self.points, self.bank)
+           state['winner'] = winner(self.points, self.bank, self.first_player)
+       return state
+
+
+
+
+class GameServer:
+   """Serves many games over JSON lines; each request is one object with an 'op' field.
+
+   Computer moves are searched in a bounded process pool. Finished searches go into a result
+   cache shared by all sessions, and each worker keeps a transposition table across requests.
+   """
+
+   def __init__(self, workers=None, deadline_ms=DEADLINE_MS, cache_size=RESULT_CACHE_SIZE):
+       self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(WORKER_TABLE_SIZE,))
+       self.deadline_ms = deadline_ms
+       self.cache = TranspositionTable(cache_size)  # Position key -> exact (score, move)
+       self.sessions = {}
+       self.ids = itertools.count(1)
+
+
+   def close(self):
+       self.pool.shutdown(cancel_futures=True)
+
+
+   def session(self, request):
+       session_id = request.get('session')
+       if type(session_id) is not int:
+           raise RequestError("session must be a session number")
+       session = self.sessions.get(session_id)
+       if session is None:
+           raise RequestError("Unknown session")
+       session.touched = time.monotonic()
+       return session
+
+
+   async def handle(self, request):
+       """Serve one request and return the response object"""
+       op = request.get('op')
+       if op == 'new':
+           return await self.new_game(request)
+       if op == 'move':
+           return await self.human_move(request)
+       if op == 'state':
+           return self.session(request).describe()
+       if op == 'close':
+           self.sessions.pop(self.session(request).id)
+           return {'session': request['session'], 'closed': True}
+       raise RequestError(f"Unknown op: {op}")
+
+
+   async def new_game(self, request):
+       """start_game: validate the settings, then let the computer open if it moves first"""
+       start = request.get('start')
+       first = request.get('first', HUMAN)
+       algorithm = request.get('algorithm', 'alphabeta')
+       algorithm = ALGORITHMS.get(algorithm) if type(algorithm) is str else None
+       depth = request.get('depth', 4)
+       if type(start) is not int or not 20 <= start <= 30:
+           raise RequestError("start must be a number between 20 and 30")
+       if first not in (HUMAN, COMPUTER):
+           raise RequestError(f"first must be {HUMAN!r} or {COMPUTER!r}")
+       if algorithm is None:
+           raise RequestError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+       if type(depth) is not int or depth < 1:
+           raise RequestError("depth must be a positive number")
+
+
+       deadline_ms = self.deadline_ms_of(request)
+
+
+       session = GameSession(next(self.ids), start, first, algorithm, depth)
+       if session.player == COMPUTER:
+           await self.computer_move(session, deadline_ms)
+       self.sessions[session.id] = session  # Only once the game has really started
+       return session.describe()
+
+
+   async def human_move(self, request):
+       session = self.session(request)
+       async with session.lock:
+           if session.over:
+               raise RequestError("The game is over")
+           if session.player != HUMAN:
+               raise RequestError("It is not the human's turn")
+           move = request.get('move')
+           if type(move) is not int or move not in MOVES:
+               raise RequestError(f"move must be one of {', '.join(map(str, MOVES))}")
+           deadline_ms = self.deadline_ms_of(request)
+
+
+           # A failed search takes the human move back, so the client can simply retry it
+           snapshot = session.snapshot()
+           session.move_history.append({'player': HUMAN, 'move': move})
+           session.apply_move(move)
+           if not session.over:
+               try:
+                   await self.computer_move(session, deadline_ms)
+               except BaseException:
+                   session.restore(snapshot)
+                   raise
+           return session.describe()
+
+
+   @staticmethod
+   def deadline_ms_of(request):
+       deadline_ms = request.get('deadline_ms')
+       if deadline_ms is not None and (type(deadline_ms) not in (int, float) or
+                                       not 0 < deadline_ms < float('inf')):
+           raise RequestError("deadline_ms must be a positive number")
+       return deadline_ms
+
+
+   async def computer_move(self, session, deadline_ms=None):
+       started = time.time()
+       deadline = started + (deadline_ms or self.deadline_ms) / 1000
+       mover_first = session.first_player == COMPUTER
+       # The evaluation only depends on the parity of the points, and searching deeper than the
+       # game can last finds the same move, which also keeps the depth inside its key field
+       key = (pack(session.value, session.points & 1, session.bank, True, mover_first,
+                   min(session.depth, max_plies(session.value))), session.algorithm)
+       entry = self.cache.lookup(key)
+       if entry is not None:
+           score, _, move = entry
+           depth, nodes, cached = session.depth, 0, True
+       else:
+           job = asyncio.get_running_loop().run_in_executor(
+               self.pool, _think, session.value, session.points, session.bank, mover_first,
+               session.algorithm, session.depth, deadline)
+           try:
+               move, score, depth, nodes = await asyncio.wait_for(
+                   job, deadline - time.time() + DEADLINE_GRACE)
+           except asyncio.TimeoutError:
+               raise RequestError("The search missed its deadline, the pool is overloaded")
+           cached = False
+           # Only searches that reached the requested depth, or the end of the game, are exact
+           if session.algorithm == PERFECT or depth >= min(session.depth,
+                                                           max_plies(session.value)):
+               self.cache.store(key, score, EXACT, move)
+
+
+       session.move_history.append({
+           'player': COMPUTER,
+           'algorithm': session.algorithm,
+           'move': move,
+           'depth': depth,
+           'nodes_visited': nodes,
+           'computation_time': time.time() - started,
+           'cached': cached
+       })
+       session.apply_move(move)
+
+
+   async def serve_client(self, reader, writer):
+       """One connection: a JSON request per line in, a JSON response per line out"""
+       try:
+           while line := await reader.readline():
+               try:
+                   request = json.loads(line)
+                   if not isinstance(request, dict):
+                       raise RequestError("A request must be a JSON object")
+                   response = {'ok': True, **await self.handle(request)}
+               except (RequestError, ValueError) as e:
+                   response = {'ok': False, 'error': str(e)}
+               except Exception:
+                   # A bug or a broken pool fails this request, not the whole connection
+                   traceback.print_exc()
+                   response = {'ok': False, 'error': "Internal server error"}
+               writer.write(json.dumps(response).encode() + b"\n")
+               await writer.drain()
+       except ConnectionError:
+           pass
+       finally:
+           writer.close()
+
+
+   async def expire_sessions(self):
+       while True:
+           await asyncio.sleep(60)
+           now = time.monotonic()
+           for session_id in [s.id for s in self.sessions.values() if now - s.touched > SESSION_TTL]:
+               del self.sessions[session_id]
+
+
+
+
+async def serve(args):
+   server = GameServer(args.workers, args.deadline_ms)
+   try:
+       if args.unix:
+           listener = await asyncio.start_unix_server(server.serve_client, args.unix)
+       else:
+           listener = await asyncio.start_server(server.serve_client, args.host, args.port)
+       print(f"Serving on {', '.join(str(s.getsockname()) for s in listener.sockets)}",
+             file=sys.stderr)
+       expiry = asyncio.create_task(server.expire_sessions())
+       async with listener:
+           await listener.serve_forever()
+       expiry.cancel()
+   finally:
+       server.close()
+
+
+def main():
+   parser = argparse.ArgumentParser(description="Serve games against the computer as JSON lines")
+   parser.add_argument('--host', default='127.0.0.1')
+   parser.add_argument('--port', type=int, default=8765)
+   parser.add_argument('--unix', help="Listen on this Unix socket instead of TCP")
+   parser.add_argument('--workers', type=int, default=None, help="Search processes")
+   parser.add_argument('--deadline-ms', type=int, default=DEADLINE_MS,
+                       help="Default time limit for a computer move")
+   args = parser.parse_args()
+
+
+   try:
+       asyncio.run(serve(args))
+   except KeyboardInterrupt:
+       pass
+
+
+
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,79 @@
+from rules import TARGET, MOVES
+
+
+
+
+class RetrogradeSolver:
+   """Exact solution for every number below TARGET, built by backward induction.
+
+   Only the parity of points + bank decides the winner, so a state is (value, parity,
+   mover is first player). `table` holds one byte per state: best move | first-wins bit.
+   """
+
+   WIN_BIT = 8
+   MOVE_MASK = 7
+
+   def __init__(self, limit=TARGET):
+       self.limit = limit
+       self.table = bytearray(limit * 4)
+       self.plies = bytearray(limit * 4)
+       self.solve()
+
+
+   @staticmethod
+   def index(value, parity, mover_first):
+       return (value * 2 + parity) * 2 + mover_first
+
+
+   def outcome(self, value, parity, mover_first):
+       """Return (first player wins, plies to the end) after reaching this state"""
+       if value >= self.limit:
+           return parity == 0, 0
+       i = self.index(value, parity, mover_first)
+       return bool(self.table[i] & self.WIN_BIT), self.plies[i]
+
+
+   def solve(self):
+       # Every move multiplies the number, so children always have larger values
+       for value in range(self.limit - 1, 0, -1):
+           for parity in (0, 1):
+               for mover_first in (0, 1):
+                   best = None
+                   for move in MOVES:
+                       new_value = value * move
+                       # Points always change by one; the bank changes on multiples of 5
+                       new_parity = parity ^ 1 ^ (1 if new_value % 5 == 0 else 0)
+                       first_wins, plies = self.outcome(new_value, new_parity, 1 - mover_first)
+                       mover_wins = first_wins == bool(mover_first)
+                       rank = (mover_wins, -plies if mover_wins else plies)
+                       if best is None or rank > best[0]:
+                           best = (rank, move, first_wins, plies + 1)
+
+
+                   _, move, first_wins, plies = best
+                   i = self.index(value, parity, mover_first)
+                   self.table[i] = move | (self.WIN_BIT if first_wins else 0)
+                   self.plies[i] = plies
+
+
+   def best_move(self, value, points, bank, mover_first):
+       """Return (move, mover wins, plies to the end) for the side to move"""
+       i = self.index(value, (points + bank) % 2, 1 if mover_first else 0)
+       entry = self.table[i]
+       first_wins = bool(entry & self.WIN_BIT)
+       return entry & self.MOVE_MASK, first_wins == bool(mover_first), self.plies[i]
+
+
+
+
+_solver = None
+
+
+
+
+def get_solver():
+   """Shared solver instance, solved on first use"""
+   global _solver
+   if _solver is None:
+       _solver = RetrogradeSolver()
+   return _solver
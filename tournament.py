@@ -0,0 +1,130 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+
+from engine import GameState, SearchEngine, MINIMAX, ALPHA_BETA, PVS, MCTS, PERFECT, ORDERINGS
+from mcts import MonteCarloSearch
+from rules import TARGET, HUMAN, COMPUTER, advance, final_score
+from transposition import TranspositionTable
+
+
+
+
+ALGORITHMS = {
+   'minimax': MINIMAX,
+   'alphabeta': ALPHA_BETA,
+   'pvs': PVS,
+   'mcts': MCTS,
+   'perfect': PERFECT
+}
+
+
+
+
+def make_engine(algorithm):
+   """Engine for one side of a game; MCTS keeps its tree between the side's moves"""
+   if algorithm == MCTS:
+       return MonteCarloSearch()  # Games already run in parallel, playouts stay in-process
+   return SearchEngine(TranspositionTable(), ordering=ORDERINGS)
+
+
+def play_game(start, first, second):
+   """Play one AI-vs-AI game; first and second are (algorithm, depth) pairs"""
+   # The engine only needs to know which side moves first, so the UI side names are reused
+   players = {COMPUTER: first, HUMAN: second}
+   engines = {side: make_engine(players[side][0]) for side in players}
+   nodes = {COMPUTER: 0, HUMAN: 0}
+
+
+   value, points, bank = start, 0, 0
+   player = COMPUTER
+   moves = []
+   latency_ms = []
+   while value < TARGET:
+       algorithm, depth = players[player]
+       result = engines[player].choose_move(GameState(value, points, bank, player, COMPUTER),
+                                            depth, algorithm)
+       nodes[player] += result.nodes_visited
+       moves.append(result.move)
+       latency_ms.append(round(result.computation_time * 1000, 3))
+
+
+       value = result.value
+       points, bank = advance(points, bank, value)
+       player = HUMAN if player == COMPUTER else COMPUTER
+
+
+   score = final_score(points, bank)
+   return {
+       'start': start,
+       'first': {'algorithm': first[0], 'depth': first[1]},
+       'second': {'algorithm': second[0], 'depth': second[1]},
+       'moves': moves,
+       'final_number': value,
+       'points': points,
+       'bank': bank,
+       'final_score': score,
+       'winner': 'first' if score % 2 == 0 else 'second',
+       'nodes_visited': {'first': nodes[COMPUTER], 'second': nodes[HUMAN]},
+       'latency_ms': latency_ms
+   }
+
+
+def _play(job):
+   return play_game(*job)
+
+
+def matchups(starts, algorithms, depths):
+   """Every start number with every ordered pair of player configurations"""
+   configs = []
+   for algorithm in algorithms:
+       # Perfect play and MCTS ignore the depth, one configuration is enough
+       for depth in (depths[:1] if algorithm in (PERFECT, MCTS) else depths):
+           configs.append((algorithm, depth))
+   for start in starts:
+       for first in configs:
+           for second in configs:
+               yield start, first, second
+
+
+def main():
+   parser = argparse.ArgumentParser(description="Headless AI-vs-AI tournament, results as JSONL")
+   parser.add_argument('--starts', type=int, nargs='+', default=list(range(20, 31)))
+   parser.add_argument('--algorithms', nargs='+', choices=sorted(ALGORITHMS),
+                       default=['minimax', 'alphabeta'])
+   parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3, 4, 5])
+   parser.add_argument('--workers', type=int, default=None, help="Worker processes")
+   parser.add_argument('--output', default='-', help="JSONL file, '-' for stdout")
+   args = parser.parse_args()
+
+
+   for start in args.starts:
+       if not 20 <= start <= 30:
+           parser.error("start numbers must be between 20 and 30")
+   jobs = list(matchups(args.starts, [ALGORITHMS[name] for name in args.algorithms],
+                        args.depths))
+
+
+   out = sys.stdout if args.output == '-' else open(args.output, 'w')
+   wins = {'first': 0, 'second': 0}
+   try:
+       with ProcessPoolExecutor(args.workers) as pool:
+           for record in pool.map(_play, jobs, chunksize=16):
+               out.write(json.dumps(record) + "\n")
+               out.flush()
+               wins[record['winner']] += 1
+   finally:
+       if out is not sys.stdout:
+           out.close()
+
+
+   print(f"{len(jobs)} games, first player won {wins['first']}, second player won {wins['second']}",
+         file=sys.stderr)
+
+
+
+
+if __name__ == "__main__":
+   main()
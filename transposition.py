@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+
+
+
+# Entry flags
+EXACT = 0  # Score is the exact minimax value
+LOWER = 1  # Search failed high, score is a lower bound
+UPPER = 2  # Search failed low, score is an upper bound
+
+POLICIES = ('lru', 'fifo')
+
+
+
+
+class TranspositionTable:
+   """Bounded cache of search results keyed on game state"""
+
+   def __init__(self, max_size=200000, policy='lru'):
+       if max_size < 1:
+           raise ValueError("max_size must be positive")
+       if policy not in POLICIES:
+           raise ValueError(f"Unknown eviction policy: {policy}")
+
+
+       self.max_size = max_size  # Maximum number of stored entries
+       self.policy = policy  # 'lru' evicts least recently used, 'fifo' the oldest stored
+       self.entries = OrderedDict()  # key -> (score, flag, best_move)
+       self.hits = 0
+       self.misses = 0
+       self.evictions = 0
+
+
+   def __len__(self):
+       return len(self.entries)
+
+
+   def lookup(self, key):
+       """Return the (score, flag, best_move) entry for key, or None"""
+       entry = self.entries.get(key)
+       if entry is None:
+           self.misses += 1
+           return None
+
+
+       self.hits += 1
+       if self.policy == 'lru':
+           self.entries.move_to_end(key)
+       return entry
+
+
+   def store(self, key, score, flag, best_move=None):
+       if key in self.entries:
+           if self.policy == 'lru':
+               self.entries.move_to_end(key)
+       elif len(self.entries) >= self.max_size:
+           self.entries.popitem(last=False)
+           self.evictions += 1
+       self.entries[key] = (score, flag, best_move)
+
+
+   def clear(self):
+       self.entries.clear()
+       self.hits = 0
+       self.misses = 0
+       self.evictions = 0
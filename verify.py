@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+from benchmark import ENGINES, ALGORITHMS
+from book import reachable_states
+from engine import GameState, SearchEngine, MINIMAX, ALPHA_BETA, PVS
+from rules import TARGET, MOVES, HUMAN, COMPUTER, advance
+from transposition import TranspositionTable
+
+
+
+
+# Engine configurations checked against the reference, with the algorithms each one runs
+CHECKS = {
+   'tree': (ALPHA_BETA,),
+   'lazy': (MINIMAX, ALPHA_BETA, PVS),
+   'tuned': (MINIMAX, ALPHA_BETA, PVS),
+   'stack': (MINIMAX, ALPHA_BETA),
+   'deepening': (ALPHA_BETA, PVS),  # The tuned engine through iterative_deepening
+   'parallel': (MINIMAX, ALPHA_BETA, PVS)
+}
+if 'batch' in ENGINES:
+   CHECKS['batch'] = (MINIMAX,)
+# Engines kept for a whole game, as the UI and the server keep them, checked at every move
+GAME_CHECKS = {
+   'persistent': (MINIMAX, ALPHA_BETA, PVS),  # Table, history and PVS aspiration carry over
+   'persistent-deepening': (ALPHA_BETA, PVS),
+   'reuse': (MINIMAX, ALPHA_BETA),  # The tree engine re-rooting the previous move's tree
+   'reuse-table': (MINIMAX, ALPHA_BETA)
+}
+# Engines of the checks that are not benchmark engines
+CHECK_ENGINES = {
+   'deepening': ENGINES['tuned'],
+   'persistent': ENGINES['tuned'],
+   'persistent-deepening': ENGINES['tuned'],
+   'reuse': ENGINES['tree'],
+   'reuse-table': lambda: SearchEngine(TranspositionTable(), lazy=False)
+}
+OWN_POOL = {'parallel'}  # Run from the main process, their engine already has a process pool
+ALGORITHM_NAMES = {algorithm: name for name, algorithm in ALGORITHMS.items()}
+
+
+
+
+def new_engine(name):
+   return CHECK_ENGINES[name]() if name in CHECK_ENGINES else ENGINES[name]()
+
+
+def reference(state, depth):
+   """Plain tree minimax without any cache: (score, move, every move that reaches the score)"""
+   engine = SearchEngine(lazy=False)
+   engine.eval_cache = None
+   result = engine.choose_move(state, depth, MINIMAX)
+   best = {child.move for child in result.root.children if child.score == result.score}
+   return result.score, result.move, best
+
+
+def run_check(name, engine, state, depth, algorithm):
+   if name.endswith('deepening'):
+       return engine.iterative_deepening(state, algorithm, float('inf'), max_depth=depth)
+   return engine.choose_move(state, depth, algorithm)
+
+
+def compare(name, engine, state, depth, algorithm, expected, strict):
+   """Run one check; return None when it agrees with the reference, else a mismatch record"""
+   score, move, best = expected
+   try:
+       result = run_check(name, engine, state, depth, algorithm)
+   except Exception as e:
+       got, error = (None, None), f"{type(e).__name__}: {e}"
+   else:
+       got, error = (result.score, result.move), None
+   # A different move of equal score is an equally good choice unless --strict
+   same_move = got[1] == move if strict else got[1] in best
+   if error is None and got[0] == score and same_move:
+       return None
+   return {
+       'engine': name,
+       'algorithm': ALGORITHM_NAMES[algorithm],
+       'depth': depth,
+       'position': (state.value, state.points, state.bank, state.first_player == COMPUTER),
+       'game': None,  # (start, first player, moves played) for the game checks
+       'expected': (score, move),
+       'got': got,
+       'error': error
+   }
+
+
+def check_position(position, depths, checks, strict):
+   """Compare every check with the reference at one position; return (searches, mismatches)"""
+   value, points, bank, mover_first = position
+   state = GameState(value, points, bank, COMPUTER, COMPUTER if mover_first else HUMAN)
+   searches = 0
+   mismatches = []
+   for depth in depths:
+       expected = reference(state, depth)
+       for name, algorithms in checks.items():
+           for algorithm in algorithms:
+               searches += 1
+               mismatch = compare(name, new_engine(name), state, depth, algorithm, expected,
+                                  strict)
+               if mismatch is not None:
+                   mismatches.append(mismatch)
+   return searches, mismatches
+
+
+def check_game(seed, depths, checks, strict):
+   """Play one random game, with one engine per check kept for all of it, and compare every
+   computer move with the reference; return (searches, mismatches)
+   """
+   rng = random.Random(seed)
+   start, first, depth = rng.randint(20, 30), rng.choice((COMPUTER, HUMAN)), rng.choice(depths)
+   engines = {(name, algorithm): new_engine(name)
+              for name, algorithms in checks.items() for algorithm in algorithms}
+   searches = 0
+   mismatches = []
+   value, points, bank, player = start, 0, 0, first
+   moves = []
+   while value < TARGET:
+       if player == COMPUTER:
+           state = GameState(value, points, bank, COMPUTER, first)
+           expected = reference(state, depth)
+           for (name, algorithm), engine in engines.items():
+               searches += 1
+               mismatch = compare(name, engine, state, depth, algorithm, expected, strict)
+               if mismatch is not None:
+                   mismatch['game'] = (start, first, tuple(moves))
+                   mismatches.append(mismatch)
+           move = expected[1]  # Every engine sees the same game
+           player = HUMAN
+       else:
+           move = rng.choice(MOVES)
+           player = COMPUTER
+       moves.append(move)
+       value *= move
+       points, bank = advance(points, bank, value)
+   return searches, mismatches
+
+
+def reproduction(mismatch):
+   algorithm, depth = ALGORITHMS[mismatch['algorithm']], mismatch['depth']
+   engine = mismatch['engine']
+   if engine.endswith('deepening'):
+       call = f"iterative_deepening(state, {algorithm!r}, inf, max_depth={depth})"
+   else:
+       call = f"choose_move(state, {depth}, {algorithm!r})"
+   if mismatch['game'] is not None:
+       start, first, moves = mismatch['game']
+       return (f"one {engine} engine for the game from {start}, {first} first, moves "
+               f"{list(moves)}: {call} at every computer move")
+   value, points, bank, mover_first = mismatch['position']
+   first = 'COMPUTER' if mover_first else 'HUMAN'
+   return (f"state = GameState({value}, {points}, {bank}, COMPUTER, {first}); "
+           f"{engine} engine: {call}")
+
+
+def verify(plies, depths, checks, games=0, strict=False, workers=None):
+   """Return (searches, mismatches) over every position within `plies` moves of a start and
+   over `games` random games
+   """
+   searches = 0
+   mismatches = []
+   work = sorted(reachable_states(plies))
+   pooled = {name: checks[name] for name in checks if name in CHECKS and name not in OWN_POOL}
+   own_pool = {name: checks[name] for name in checks if name in OWN_POOL}
+   game_checks = {name: checks[name] for name in checks if name in GAME_CHECKS}
+   with ProcessPoolExecutor(workers) as pool:
+       runs = []
+       if pooled:
+           check = partial(check_position, depths=depths, checks=pooled, strict=strict)
+           runs.append(pool.map(check, work, chunksize=max(1, len(work) // 64)))
+       if game_checks and games:
+           check = partial(check_game, depths=depths, checks=game_checks, strict=strict)
+           runs.append(pool.map(check, range(games), chunksize=max(1, games // 64)))
+       for run in runs:
+           for count, found in run:
+               searches += count
+               mismatches.extend(found)
+   for position in work if own_pool else ():
+       count, found = check_position(position, depths, own_pool, strict)
+       searches += count
+       mismatches.extend(found)
+   return searches, mismatches
+
+
+def print_report(searches, mismatches):
+   print(f"{searches} searches, {len(mismatches)} mismatches")
+   groups = {}
+   for mismatch in mismatches:
+       groups.setdefault((mismatch['engine'], mismatch['algorithm']), []).append(mismatch)
+   for (name, algorithm), found in sorted(groups.items()):
+       # The shallowest search of the smallest number, closest to a start, is the easiest to debug
+       smallest = min(found, key=lambda m: (m['depth'], m['position']))
+       problem = smallest['error'] or "expected score {} move {}, got score {} move {}".format(
+           *smallest['expected'], *smallest['got'])
+       print(f"{name}/{algorithm}: {len(found)} mismatches, smallest at depth {smallest['depth']}, "
+             f"value {smallest['position'][0]}: {problem}")
+       print(f"   {reproduction(smallest)}")
+
+
+def main():
+   parser = argparse.ArgumentParser(
+       description="Check the optimised search engines against plain minimax")
+   parser.add_argument('--plies', type=int, default=4, help="Moves from the start to cover")
+   parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 3, 4, 5])
+   parser.add_argument('--games', type=int, default=1000,
+                       help="Random games played with the engines kept for the whole game")
+   parser.add_argument('--engines', nargs='+', choices=list(CHECKS) + list(GAME_CHECKS),
+                       default=list(CHECKS) + list(GAME_CHECKS))
+   parser.add_argument('--workers', type=int, default=os.cpu_count())
+   parser.add_argument('--strict', action='store_true',
+                       help="Also fail when an engine picks a different move of equal score")
+   args = parser.parse_args()
+
+
+   checks = {name: {**CHECKS, **GAME_CHECKS}[name] for name in args.engines}
+   searches, mismatches = verify(args.plies, args.depths, checks, args.games, args.strict,
+                                 args.workers)
+   print_report(searches, mismatches)
+   sys.exit(1 if mismatches else 0)
+
+
+
+
+if __name__ == "__main__":
+   main()